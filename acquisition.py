@@ -0,0 +1,90 @@
+import threading
+import time
+from typing import Any, List, Optional
+from sensor_data_collector import SensorDataCollector
+import instrumentation
+
+# what SpscQueue.push does when the queue is full
+OVERFLOW_DROP = 'drop'    # the new item is discarded and counted in SpscQueue.dropped
+OVERFLOW_BLOCK = 'block'  # the producer waits for the consumer to make room
+
+
+# bounded queue between exactly one producer thread and one consumer thread
+# the producer only ever writes `tail` and the consumer only ever writes `head`, and both are single
+# attribute stores, so no lock is needed for the handoff
+class SpscQueue:
+    def __init__(self, capacity: int = 256, overflow: str = OVERFLOW_DROP):
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_BLOCK):
+            raise ValueError(f"Unknown overflow policy {overflow}")
+        self.capacity = capacity
+        self.overflow = overflow
+        self.slots: List[Any] = [None] * capacity
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    # producer side, returns False if the item was dropped
+    # a blocked push gives up and drops the item once `running` is cleared, so a producer waiting on a full queue
+    # can still be stopped from the consumer's thread
+    def push(self, item, poll_interval: float = 0.001, running: Optional[threading.Event] = None) -> bool:
+        while self.tail - self.head == self.capacity:
+            if self.overflow == OVERFLOW_DROP or (running is not None and not running.is_set()):
+                self.dropped += 1
+                return False
+            time.sleep(poll_interval)
+        self.slots[self.tail % self.capacity] = item
+        self.tail += 1
+        return True
+
+    # consumer side, takes everything that has been pushed so far
+    def popAll(self) -> List[Any]:
+        head, tail = self.head, self.tail
+        items = []
+        for index in range(head, tail):
+            slot = index % self.capacity
+            items.append(self.slots[slot])
+            self.slots[slot] = None
+        self.head = tail
+        return items
+
+
+# reads from the collector's device on its own thread so a blocking read never stalls the GUI
+class AcquisitionWorker(threading.Thread):
+    def __init__(self, collector: SensorDataCollector, queue: SpscQueue, read_timeout: float = 0.1,
+                 stop_timeout: float = 1.0):
+        super().__init__(name='acquisition', daemon=True)
+        self.collector = collector
+        self.queue = queue
+        self.read_timeout = read_timeout
+        self.stop_timeout = stop_timeout
+        # set before the thread starts so a stop() right after start() isn't undone by run()
+        self.running = threading.Event()
+        self.running.set()
+        self.error: Optional[Exception] = None
+
+    # a device error ends the thread, it's kept in `error` for the consumer to report
+    def run(self):
+        try:
+            self.collector.start()
+            while self.running.is_set():
+                if instrumentation.enabled:
+                    start = time.perf_counter_ns()
+                    batch = self.collector.readAvailable(self.read_timeout)
+                    instrumentation.record('readAvailable', start, 'acquisition')
+                else:
+                    batch = self.collector.readAvailable(self.read_timeout)
+                if len(batch):
+                    self.queue.push(batch, running=self.running)
+        except Exception as error:
+            self.error = error
+            self.running.clear()
+
+    # called from the consumer's thread, so it can't wait on the queue draining
+    # a read blocked in the device for longer than stop_timeout is left to finish on its own, the thread is a daemon
+    # and is_alive() stays true until it has
+    def stop(self):
+        self.running.clear()
+        self.join(self.stop_timeout)
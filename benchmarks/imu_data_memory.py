@@ -0,0 +1,74 @@
+# heap cost per sample of the different ways of holding imu samples
+# run from the repository root: python benchmarks/imu_data_memory.py [--samples N]
+import argparse
+import gc
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_structures import *
+
+
+# fills an imu_dtype array with random values so no two samples share float objects
+def random_records(count: int) -> np.ndarray:
+    records = np.zeros(count, imu_dtype)
+    raw = records.view(np.uint8).reshape(count, imu_dtype.itemsize)
+    # the 25 doubles are random, the 4 calibration bytes stay 0-3 like the sensor's
+    raw[:, :200] = np.random.random((count, 25)).view(np.uint8)
+    raw[:, 200:] = np.random.randint(0, 4, (count, 4), dtype=np.uint8)
+    return records
+
+# bytes held by an object and everything it references, shared objects are only counted once
+# (tracemalloc would be simpler but its own bookkeeping runs out of memory at a million namedtuples)
+def deep_size(obj) -> int:
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, np.ndarray):
+            # views don't own their data, the array they were taken from does
+            if obj.base is not None:
+                stack.append(obj.base)
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, ImuRecord):
+            stack.extend((obj.records, obj.index))
+    return size
+
+# bytes held by what `build` returns, and how long building it took
+def measure(build):
+    gc.collect()
+    start = time.perf_counter()
+    held = build()
+    seconds = time.perf_counter() - start
+    size = deep_size(held)
+    del held
+    return size, seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    records = random_records(args.samples)
+    cases = {
+        'structured array': lambda: records.copy(),
+        'ImuData namedtuples': lambda: [imu_data_from_record(record) for record in records],
+        'ImuRecord views': lambda: list(ImuDataArray(records)),
+    }
+
+    print(f'{args.samples} samples, {imu_dtype.itemsize} bytes per packed record')
+    for name, build in cases.items():
+        size, seconds = measure(build)
+        print(f'  {name:<22}{size / args.samples:8.1f} bytes/sample {size / 2**20:9.1f} MiB {seconds:7.2f} s')
+    print('  (ImuRecord views include the structured array they index)')
+
+if __name__ == '__main__':
+    main()
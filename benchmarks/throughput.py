@@ -0,0 +1,312 @@
+# headless throughput of the data path and every page's update, written as JSON so runs can be compared
+# run from the repository root:
+#   python benchmarks/throughput.py --output before.json
+#   python benchmarks/throughput.py --output after.json --compare before.json
+# pages are drawn with the offscreen Qt platform, GL is drawn into an EGL pbuffer (Mesa's llvmpipe works)
+import argparse
+import ctypes
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+# has to be set before Qt and PyOpenGL are imported
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import numpy as np
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_root)
+os.chdir(repo_root)
+
+from PyQt6.QtCore import qInstallMessageHandler
+from PyQt6.QtWidgets import QApplication
+
+# Qt warnings are repeated on every update, they are counted into the results instead of flooding the output
+qt_messages = Counter()
+qInstallMessageHandler(lambda mode, context, message: qt_messages.update([message.splitlines()[0]]))
+app = QApplication(sys.argv[:1])
+
+from widgets import FeedbackPage, FlexSensorRawDataPage, ForceRawDataPage, ImuRawDataPage, RawDataPage
+from widgets.leg_display import FrontLegFunctions, LegDisplay, MultiLegDisplay, PoseMeshCache, SideLegFunctions
+from data_view_publisher import DataViewPublisher, default_frame_rate
+from data_structures import *
+from sensor_data_collector import imu_sample_rate, read_bin_chunks, read_imu_file, sample_data_file_path, unpack_imu_data
+from data_store import imu_channels
+from signal_filters import BiquadFilter, ComplementaryFilter, FilterPipeline, MovingAverage, SpikeRejection, default_filter_pipeline
+
+default_histories = [1000, 10000, 100000]
+gl_size = (420, 400)
+# the filters are benchmarked at this rate over every float channel, well above the IMU's own rate
+filter_sample_rate = 1000
+
+
+# calls fn until min_time has passed, items is how many samples one call handles
+def measure(fn: Callable[[], None], items: int = 1, min_time: float = 0.5) -> Dict[str, float]:
+    fn()
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return {
+        'samples_per_sec': calls * items / elapsed,
+        'ms_per_call': elapsed / calls * 1000,
+        'samples_per_call': items
+    }
+
+# makes an EGL pbuffer context current for the GL benchmarks, None if there isn't one to be had
+def make_gl_context(width: int, height: int) -> Optional[str]:
+    try:
+        from OpenGL import EGL
+        from OpenGL.GL import glGetString, GL_RENDERER
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        if not EGL.eglInitialize(display, None, None):
+            return None
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        attributes = (EGL.EGLint * 9)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_DEPTH_SIZE, 16, EGL.EGL_NONE
+        )
+        if not EGL.eglChooseConfig(display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count)) or not count.value:
+            return None
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+        surface = EGL.eglCreatePbufferSurface(display, config, (EGL.EGLint * 5)(EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE))
+        if not EGL.eglMakeCurrent(display, surface, surface, context):
+            return None
+        return glGetString(GL_RENDERER).decode()
+    except Exception as error:
+        print(f'no GL context, skipping GL benchmarks: {error}', file=sys.stderr)
+        return None
+
+# `count` samples cycled from the sample log
+def sample_records(count: int) -> np.ndarray:
+    records = read_imu_file(sample_data_file_path).records
+    return records[np.arange(count) % len(records)]
+
+def decode_benchmarks(min_time: float) -> Dict[str, dict]:
+    records = sample_records(10000)
+    binary = records.tobytes()
+    packed = [binary[i:i + imu_dtype.itemsize] for i in range(0, len(binary), imu_dtype.itemsize)]
+    results = {}
+
+    def unpack_all():
+        for record in packed:
+            unpack_imu_data(record)
+    results['unpack_imu_data'] = measure(unpack_all, len(packed), min_time)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'imu_data.bin')
+        with open(path, 'wb') as log:
+            log.write(binary)
+
+        def read_all():
+            for _ in read_bin_chunks(path):
+                pass
+        results['read_bin_chunks'] = measure(read_all, len(records), min_time)
+    return results
+
+# each filter, and the default pipeline, over every float channel at filter_sample_rate, a frame's batch at a time
+# samples_per_sec / filter_sample_rate is how many such streams one core keeps up with
+def filter_benchmarks(min_time: float) -> Dict[str, dict]:
+    channels = [channel for channel in imu_channels if 'Calibration' not in channel]
+    records = sample_records(filter_sample_rate)
+    batch = records[:round(filter_sample_rate / default_frame_rate)]
+    pipelines = {
+        'SpikeRejection': FilterPipeline([SpikeRejection(channels)]),
+        'BiquadFilter.lowpass': FilterPipeline([BiquadFilter(channels, 'lowpass', 20, filter_sample_rate)]),
+        'BiquadFilter.highpass': FilterPipeline([BiquadFilter(channels, 'highpass', 0.5, filter_sample_rate)]),
+        'MovingAverage': FilterPipeline([MovingAverage(channels, 10)]),
+        'ComplementaryFilter': FilterPipeline([ComplementaryFilter(
+            ['positionData.eulerOrientation.roll', 'positionData.eulerOrientation.pitch'], ['gyroData.x', 'gyroData.y'],
+            0.98, filter_sample_rate)]),
+        'default_filter_pipeline': default_filter_pipeline(filter_sample_rate, channels),
+    }
+    results = {}
+    for name, pipeline in pipelines.items():
+        results[name] = measure(lambda pipeline=pipeline: pipeline.process(batch), len(batch), min_time)
+        results[name]['channels'] = len(pipeline.filters[0].channels)
+    return results
+
+# every page's update against a store already holding `history` samples
+def page_benchmarks(history: int, min_time: float, gl_renderer: Optional[str]) -> Dict[str, dict]:
+    publisher = DataViewPublisher(capacity=history)
+    records = sample_records(history + 1)
+    publisher.store.extendImu(records[:history])
+    sample = ImuDataArray(records[history:])
+    # samples that arrive per frame at the default rates
+    batch = ImuDataArray(records[:max(1, round(imu_sample_rate / default_frame_rate))])
+    results = {}
+
+    pages = {
+        'ImuRawDataPage': ImuRawDataPage(publisher, label='Ankle', visible=True),
+        'FlexSensorRawDataPage': FlexSensorRawDataPage(publisher, label='Angle', visible=True),
+        'ForceRawDataPage': ForceRawDataPage(publisher, label='Feet', visible=True),
+        'FeedbackPage': FeedbackPage(publisher, visible=True),
+        'RawDataPage': RawDataPage(publisher, visible=True),
+    }
+    for page in pages.values():
+        page.resize(1000, 700)
+        page.show()
+        page.refresh()
+    app.processEvents()
+
+    # renderFrame's work: the batch goes into the store, then to every subscriber
+    def publish():
+        publisher.store.extendImu(batch.records)
+        publisher.notifySubscribers(batch)
+    results['notifySubscribers'] = measure(publish, len(batch), min_time)
+
+    # pages skip redrawing when nothing new is in the store, so every call writes one sample first
+    line_updates = {
+        'ImuRawDataPage': pages['ImuRawDataPage'].updateLines,
+        'FlexSensorRawDataPage': pages['FlexSensorRawDataPage'].updateLines,
+        'RawDataPage': pages['RawDataPage'].update_graphs,
+    }
+    for name, page in pages.items():
+        def update_data(page=page):
+            publisher.store.extendImu(sample.records)
+            page.updateData(sample[0])
+        results[f'{name}.updateData'] = measure(update_data, 1, min_time)
+        if name in line_updates:
+            def update_lines(update=line_updates[name]):
+                publisher.store.extendImu(sample.records)
+                update()
+            results[f'{name}.updateLines'] = measure(update_lines, 1, min_time)
+
+    results.update(leg_benchmarks(history, min_time, gl_renderer))
+
+    for page in pages.values():
+        page.close()
+    publisher.store.close()
+    return results
+
+# leg meshes for a replay of `history` poses, and drawing them
+def leg_benchmarks(history: int, min_time: float, gl_renderer: Optional[str]) -> Dict[str, dict]:
+    rng = np.random.default_rng(0)
+    knees = rng.uniform(90, 180, history)
+    coms = rng.uniform(-1, 1, history)
+    cache = PoseMeshCache()
+    functions = [FrontLegFunctions(cache=cache), FrontLegFunctions(cache=cache),
+                 SideLegFunctions('left', cache=cache), SideLegFunctions('right', cache=cache)]
+    position = [0]
+    results = {}
+
+    def next_pose():
+        index = position[0] % history
+        position[0] += 1
+        for leg in functions:
+            leg.updateLeg(knees[index], 90, coms[index])
+
+    def get_points():
+        next_pose()
+        for leg in functions:
+            leg.getPoints()
+    results['LegFunctions.getPoints'] = measure(get_points, 1, min_time)
+    results['LegFunctions.getPoints']['cache_hit_rate'] = cache.stats()['hit_rate']
+
+    if gl_renderer is None:
+        return results
+    from OpenGL.GL import glFinish
+
+    single = LegDisplay()
+    single.resize(*gl_size)
+    single.initializeGL()
+    single.resizeGL(*gl_size)
+
+    def paint_single():
+        next_pose()
+        single.updatePoints(functions[0].getPoints())
+        single.paintGL()
+        glFinish()
+    results['LegDisplay.paintGL'] = measure(paint_single, 1, min_time)
+
+    multi = MultiLegDisplay(2, 2)
+    multi.resize(*gl_size)
+    multi.initializeGL()
+
+    def paint_multi():
+        next_pose()
+        for index, leg in enumerate(functions):
+            multi.updateView(index, leg.getPoints())
+        multi.paintGL()
+        glFinish()
+    results['MultiLegDisplay.paintGL'] = measure(paint_multi, 1, min_time)
+    # the widgets have no QOpenGLContext to clean up after them on this context
+    single.renderer.cleanup()
+    multi.renderer.cleanup()
+    return results
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# flattens {section: {benchmark: result}} into {'section/benchmark': samples_per_sec}
+def flat_rates(report: dict) -> Dict[str, float]:
+    rates = {}
+    for section, benchmarks in report['results'].items():
+        for name, result in benchmarks.items():
+            rates[f'{section}/{name}'] = result['samples_per_sec']
+    return rates
+
+def print_comparison(report: dict, baseline: dict):
+    current, previous = flat_rates(report), flat_rates(baseline)
+    print(f'compared with {baseline["meta"].get("commit")}:')
+    for name, rate in current.items():
+        if name in previous:
+            print(f'  {name:<60}{rate / previous[name]:7.2f}x')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default='benchmark-results.json', help='where the JSON results are written')
+    parser.add_argument('--history', type=int, nargs='+', default=default_histories, help='store sizes to run the page benchmarks at')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds each benchmark runs for')
+    parser.add_argument('--compare', metavar='JSON', help='earlier results to print speedups against')
+    args = parser.parse_args()
+
+    gl_renderer = make_gl_context(*gl_size)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'qt_platform': os.environ['QT_QPA_PLATFORM'],
+            'gl_renderer': gl_renderer
+        },
+        'results': {}
+    }
+
+    report['results']['decode'] = decode_benchmarks(args.min_time)
+    report['results']['filters'] = filter_benchmarks(args.min_time)
+    for history in args.history:
+        print(f'history {history}...', file=sys.stderr)
+        report['results'][f'history_{history}'] = page_benchmarks(history, args.min_time, gl_renderer)
+
+    report['meta']['qt_messages'] = dict(qt_messages)
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    for section, benchmarks in report['results'].items():
+        print(section)
+        for name, result in benchmarks.items():
+            print(f'  {name:<40}{result["samples_per_sec"]:14.1f} samples/s {result["ms_per_call"]:10.3f} ms/call')
+    if args.compare:
+        with open(args.compare) as baseline:
+            print_comparison(report, json.load(baseline))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+import os
+from operator import attrgetter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from data_structures import *
+
+# number of samples kept in memory per channel, 10 minutes at 100Hz
+default_store_capacity = 60000
+
+# every leaf field of a structured dtype as a dotted channel name
+# e.g. imu_dtype -> ['accelData.x', ..., 'positionData.quatOrientation.w', ..., 'magCalibration']
+def dtype_channels(dtype: np.dtype, prefix: str = '') -> List[str]:
+    channels = []
+    for name in dtype.names:
+        field_dtype = dtype.fields[name][0]
+        if field_dtype.names:
+            channels += dtype_channels(field_dtype, f'{prefix}{name}.')
+        else:
+            channels.append(f'{prefix}{name}')
+    return channels
+
+# view of a (possibly nested) field of a structured array given its channel name
+def channel_field(records: np.ndarray, channel: str) -> np.ndarray:
+    for name in channel.split('.'):
+        records = records[name]
+    return records
+
+imu_channels = dtype_channels(imu_dtype)
+# channel names are also attribute paths into ImuData
+imu_channel_getters = [(channel, attrgetter(channel)) for channel in imu_channels]
+
+
+# keeps the newest `capacity` values of one channel in preallocated memory
+# values are written into a buffer twice the capacity, once it fills up the newest `capacity` values are
+# moved back to the front, so the retained values are always one contiguous slice and appends are amortized O(1)
+class RingBuffer:
+    def __init__(self, capacity: int, dtype=np.float64, spill_path: Optional[str] = None):
+        self.capacity = capacity
+        self.buffer = np.zeros(2 * capacity, dtype=dtype)
+        self.end = 0
+        # total number of values ever written
+        self.count = 0
+        # values pushed out of memory are appended here as raw binary, np.fromfile(spill_path, dtype) reads them back
+        self.spill_path = spill_path
+        self.spill_file = None
+
+    def __len__(self):
+        return min(self.end, self.capacity)
+
+    def append(self, value):
+        if self.end == len(self.buffer):
+            self.compact()
+        self.buffer[self.end] = value
+        self.end += 1
+        self.count += 1
+
+    def extend(self, values: np.ndarray):
+        values = np.asarray(values)
+        while len(values):
+            if self.end == len(self.buffer):
+                self.compact()
+            size = min(len(values), len(self.buffer) - self.end)
+            self.buffer[self.end:self.end + size] = values[:size]
+            self.end += size
+            self.count += size
+            values = values[size:]
+
+    # view of the newest `last` retained values (all of them by default), oldest first
+    # the view is only valid until the next write
+    def view(self, last: Optional[int] = None) -> np.ndarray:
+        size = len(self) if last is None else min(last, len(self))
+        return self.buffer[self.end - size:self.end]
+
+    def latest(self):
+        return self.buffer[self.end - 1]
+
+    # forgets every value, nothing is spilled
+    def clear(self):
+        self.end = 0
+        self.count = 0
+
+    def compact(self):
+        evicted = self.buffer[:self.end - self.capacity]
+        if self.spill_path is not None and len(evicted):
+            if self.spill_file is None:
+                self.spill_file = open(self.spill_path, 'ab')
+            evicted.tofile(self.spill_file)
+        self.buffer[:self.capacity] = self.buffer[self.end - self.capacity:self.end]
+        self.end = self.capacity
+
+    def close(self):
+        # whatever is still in the buffer but outside the retained window goes to disk too
+        if self.spill_path is not None and self.end > self.capacity:
+            self.compact()
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+
+# min/max envelope of a RingBuffer's history at every zoom level, for drawing long histories in about 2 points per pixel
+# level k holds the min and max of each block of factor**(k + 1) samples and is built from level k - 1, so new
+# samples only ever touch the blocks they complete; it catches up with the source whenever it is read
+# every block keeps its min and max, so a spike one sample wide still shows at any zoom
+class MinMaxPyramid:
+    def __init__(self, source: RingBuffer, factor: int = 4):
+        self.source = source
+        self.factor = factor
+        self.block_sizes: List[int] = []
+        size = factor
+        while size <= source.capacity:
+            self.block_sizes.append(size)
+            size *= factor
+        dtype = source.buffer.dtype
+        self.mins = [RingBuffer(source.capacity // size + 1, dtype) for size in self.block_sizes]
+        self.maxs = [RingBuffer(source.capacity // size + 1, dtype) for size in self.block_sizes]
+        self.reset(source.count - len(source))
+
+    # starts over from the sample with absolute index origin, blocks are aligned to it
+    def reset(self, origin: int):
+        self.origin = origin
+        # absolute index of the next sample to take from the source
+        self.consumed = origin
+        for mins, maxs in zip(self.mins, self.maxs):
+            mins.clear()
+            maxs.clear()
+        # values of the level below (samples for level 0) that don't fill a block yet
+        self.pending_mins = [np.zeros(0, self.source.buffer.dtype) for _ in self.block_sizes]
+        self.pending_maxs = [np.zeros(0, self.source.buffer.dtype) for _ in self.block_sizes]
+
+    def update(self):
+        count = self.source.count
+        new = count - self.consumed
+        if new <= 0:
+            return
+        # samples left memory before they were seen, the blocks can't be completed any more
+        if new > len(self.source):
+            self.reset(count - len(self.source))
+            new = len(self.source)
+        mins = maxs = self.source.view(new)
+        self.consumed = count
+        for level in range(len(self.block_sizes)):
+            mins = np.concatenate((self.pending_mins[level], mins))
+            maxs = np.concatenate((self.pending_maxs[level], maxs))
+            full = len(mins) - len(mins) % self.factor
+            self.pending_mins[level] = mins[full:].copy()
+            self.pending_maxs[level] = maxs[full:].copy()
+            if not full:
+                break
+            mins = mins[:full].reshape(-1, self.factor).min(axis=1)
+            maxs = maxs[:full].reshape(-1, self.factor).max(axis=1)
+            self.mins[level].extend(mins)
+            self.maxs[level].extend(maxs)
+
+    # samples [start, end) as at most about 2 * points vertices, x is the absolute sample index
+    # the range is clipped to the samples still in memory
+    def envelope(self, start: float, end: float, points: int) -> Tuple[np.ndarray, np.ndarray]:
+        self.update()
+        start = int(max(start, self.consumed - len(self.source), self.origin))
+        end = int(min(end, self.consumed))
+        if end <= start:
+            return np.zeros(0), np.zeros(0, self.source.buffer.dtype)
+        span = end - start
+        if span <= 2 * points:
+            return np.arange(start, end, dtype=np.float64), self.source.view(self.consumed - start)[:span]
+
+        # finest level that fits, or the coarsest one
+        level = next((level for level, size in enumerate(self.block_sizes) if span / size <= points), len(self.block_sizes) - 1)
+        size = self.block_sizes[level]
+        written = self.mins[level].count
+        first_retained = written - len(self.mins[level])
+        first_block = max((start - self.origin) // size, first_retained)
+        last_block = min((end - self.origin) // size, written)
+        blocks = max(last_block - first_block, 0)
+        # the newest samples that don't fill a block yet are reduced straight from the source
+        tail_start = max(self.origin + last_block * size, start)
+        # (vertex pair, min/max) filled in place, one pair per block and one for the tail
+        x = np.empty((blocks + (tail_start < end), 2))
+        y = np.empty(x.shape, self.source.buffer.dtype)
+        x[:blocks] = self.origin + (np.arange(first_block, last_block)[:, None] + 0.5) * size
+        y[:blocks, 0] = self.mins[level].view()[first_block - first_retained:last_block - first_retained]
+        y[:blocks, 1] = self.maxs[level].view()[first_block - first_retained:last_block - first_retained]
+        if tail_start < end:
+            tail = self.source.view(self.consumed - tail_start)[:end - tail_start]
+            x[blocks] = (tail_start + end) / 2
+            y[blocks] = tail.min(), tail.max()
+        return x.ravel(), y.ravel()
+
+
+# shared history of every sample, one RingBuffer per channel
+# the publisher writes each sample once and pages plot views straight out of the buffers
+# with a spill_dir, samples that fall out of memory are written to <spill_dir>/<channel>.bin instead of dropped
+class SampleStore:
+    def __init__(self, capacity: int = default_store_capacity, spill_dir: Optional[str] = None):
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.channels: Dict[str, RingBuffer] = {}
+        # built the first time a channel's envelope is asked for
+        self.pyramids: Dict[str, MinMaxPyramid] = {}
+        for channel in imu_channels:
+            self.addChannel(channel, channel_field(np.zeros((), imu_dtype), channel).dtype)
+
+    def addChannel(self, channel: str, dtype=np.float64) -> RingBuffer:
+        if channel not in self.channels:
+            spill_path = None if self.spill_dir is None else os.path.join(self.spill_dir, f'{channel}.bin')
+            self.channels[channel] = RingBuffer(self.capacity, dtype, spill_path)
+        return self.channels[channel]
+
+    # number of imu samples currently held in memory
+    def __len__(self):
+        return len(self.channels[imu_channels[0]])
+
+    # number of imu samples ever written
+    @property
+    def count(self) -> int:
+        return self.channels[imu_channels[0]].count
+
+    def appendImu(self, data: ImuData):
+        for channel, getter in imu_channel_getters:
+            self.channels[channel].append(getter(data))
+
+    def extendImu(self, records: np.ndarray):
+        for channel in imu_channels:
+            self.channels[channel].extend(channel_field(records, channel))
+
+    # adds a channel <prefix>.<field> for every field of a structured dtype, for values derived from the imu samples
+    def addRecordChannels(self, dtype: np.dtype, prefix: str):
+        for channel in dtype_channels(dtype):
+            self.addChannel(f'{prefix}.{channel}', channel_field(np.zeros((), dtype), channel).dtype)
+
+    def extendRecords(self, records: np.ndarray, prefix: str):
+        for channel in dtype_channels(records.dtype):
+            self.channels[f'{prefix}.{channel}'].extend(channel_field(records, channel))
+
+    def view(self, channel: str, last: Optional[int] = None) -> np.ndarray:
+        return self.channels[channel].view(last)
+
+    def latest(self, channel: str):
+        return self.channels[channel].latest()
+
+    # min/max envelope of a channel's samples [start, end), see MinMaxPyramid.envelope
+    def envelope(self, channel: str, start: float, end: float, points: int) -> Tuple[np.ndarray, np.ndarray]:
+        if channel not in self.pyramids:
+            self.pyramids[channel] = MinMaxPyramid(self.channels[channel])
+        return self.pyramids[channel].envelope(start, end, points)
+
+    # rebuilds the newest `last` retained imu samples (all of them by default) as imu_dtype records, oldest first
+    def records(self, last: Optional[int] = None) -> np.ndarray:
+        size = len(self) if last is None else min(last, len(self))
+        records = np.zeros(size, imu_dtype)
+        for channel in imu_channels:
+            channel_field(records, channel)[...] = self.channels[channel].view(size)
+        return records
+
+    # rebuilds a retained sample, index 0 is the oldest sample in memory
+    def imuDataAt(self, index: int) -> ImuRecord:
+        record = np.zeros(1, imu_dtype)
+        for channel in imu_channels:
+            channel_field(record, channel)[0] = self.channels[channel].view()[index]
+        return ImuRecord(record, 0)
+
+    def close(self):
+        for buffer in self.channels.values():
+            buffer.close()
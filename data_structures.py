@@ -1,5 +1,6 @@
 from collections import namedtuple
 from typing import NamedTuple
+import numpy as np
 
 Axis3d = namedtuple("Axis3d", ["x", "y", "z"])
 Quaternion = namedtuple("Quaternion", ["w", "x", "y", "z"])
@@ -22,5 +23,90 @@ class ImuData(NamedTuple):
     gyroCalibration: int
     magCalibration: int
 
+# numpy layouts mirroring the namedtuples above, byte-for-byte the same as the
+# packed "< 18d 4d 3d 4B" record written by the IMU
+axis3d_dtype = np.dtype([("x", "<f8"), ("y", "<f8"), ("z", "<f8")])
+quaternion_dtype = np.dtype([("w", "<f8"), ("x", "<f8"), ("y", "<f8"), ("z", "<f8")])
+euler_angles_dtype = np.dtype([("roll", "<f8"), ("pitch", "<f8"), ("yaw", "<f8")])
 
+position_data_dtype = np.dtype([
+    ("position", axis3d_dtype),
+    ("quatOrientation", quaternion_dtype),
+    ("eulerOrientation", euler_angles_dtype)
+])
 
+imu_dtype = np.dtype([
+    ("accelData", axis3d_dtype),
+    ("linearAccelData", axis3d_dtype),
+    ("gravityAccel", axis3d_dtype),
+    ("gyroData", axis3d_dtype),
+    ("magData", axis3d_dtype),
+    ("positionData", position_data_dtype),
+    ("sysCalibration", "u1"),
+    ("accelCalibration", "u1"),
+    ("gyroCalibration", "u1"),
+    ("magCalibration", "u1")
+])
+
+# builds the namedtuple form of a single imu_dtype record
+def imu_data_from_record(record) -> ImuData:
+    accelData, linearAccelData, gravityAccel, gyroData, magData, positionData, \
+        sysCalibration, accelCalibration, gyroCalibration, magCalibration = record.item()
+    position, quatOrientation, eulerOrientation = positionData
+    return ImuData(
+        Axis3d(*accelData), Axis3d(*linearAccelData), Axis3d(*gravityAccel), Axis3d(*gyroData), Axis3d(*magData),
+        PositionData(Axis3d(*position), Quaternion(*quatOrientation), EulerAngles(*eulerOrientation)),
+        sysCalibration, accelCalibration, gyroCalibration, magCalibration
+    )
+
+# one sample of a structured array of imu_dtype records, read in place
+# has the same attribute paths as ImuData (sample.accelData.x, sample.positionData.quatOrientation.w, ...)
+# but holds only the array and the row index, fields are read out of the array when they are accessed
+class ImuRecord:
+    __slots__ = ('records', 'index')
+
+    def __init__(self, records: np.ndarray, index: int):
+        self.records = records
+        self.index = index
+
+    def __getattr__(self, name: str):
+        if name.startswith('_') or self.records.dtype.names is None or name not in self.records.dtype.names:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+        field = self.records[name]
+        # nested records (accelData, positionData, ...) are views over the same row
+        if field.dtype.names:
+            return ImuRecord(field, self.index)
+        return field[self.index].item()
+
+    # iterates the fields in order, like unpacking the matching namedtuple
+    def __iter__(self):
+        for name in self.records.dtype.names:
+            yield getattr(self, name)
+
+    def __len__(self):
+        return len(self.records.dtype.names)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.records[self.index]})'
+
+    # the namedtuple form, for code that needs tuple behaviour
+    def toImuData(self) -> ImuData:
+        return imu_data_from_record(self.records[self.index])
+
+# sequence of samples over a structured array of imu_dtype records
+# indexing gives an ImuRecord view, nothing is unpacked into Python objects up front
+class ImuDataArray:
+    def __init__(self, records: np.ndarray):
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ImuDataArray(self.records[index])
+        return ImuRecord(self.records, index)
+
+    def __iter__(self):
+        for index in range(len(self.records)):
+            yield ImuRecord(self.records, index)
@@ -1,36 +1,282 @@
-from typing import List
+import os
+import time
+import traceback
+from typing import Dict, List, Optional, Set
+import numpy as np
 from widgets.data_page_interface import DataPageInterface
-from sensor_data_collector import SensorDataCollector
+from sensor_data_collector import SensorDataCollector, imu_sample_rate
+from acquisition import AcquisitionWorker, SpscQueue, OVERFLOW_DROP
+from data_store import SampleStore, default_store_capacity
+from data_structures import ImuDataArray
+from session_file import SessionWriter, session_extension, session_streams
+from kinematics import KinematicsEngine, imu_quaternions, joint_angles_dtype
+import instrumentation
 from PyQt6.QtWidgets import QWidget, QWidget
-from PyQt6.QtCore import QTimer
+from PyQt6.QtCore import QTimer, Qt
+
+# rate the pages are redrawn at
+default_frame_rate = 30
+# session stream the collector's samples are recorded to, the collector only reads one imu for now
+session_imu_stream = 'ankleImu'
+# joint angles are written to the store as kinematics.kneeFlexion, kinematics.ankleDorsiflexion, ...
+kinematics_prefix = 'kinematics'
+# the subject stands straight for this long at the start of every collection, joint angles are measured from that pose
+calibration_seconds = 0.5
 
 # Publishes data to feedback page and raw data page
+# samples are acquired at sample_rate and queued, every frame the queued samples are handed to the pages as one batch
+# with a device, acquisition runs on an AcquisitionWorker thread instead of the acquisition timer
+# with a session_dir, every collection is also recorded to a session file in it, see session_file.py
+# samples are filtered before they reach the store and the pages, sessions record them unfiltered
+# filters is a signal_filters.FilterPipeline, without one default_filter_pipeline is built when the first collection
+# starts, since importing scipy takes over a second; raw=True turns filtering off
 class DataViewPublisher:
-    def __init__(self):
-        self.sensorDataCollector = SensorDataCollector()
+    def __init__(self, capacity: int = default_store_capacity, spill_dir: Optional[str] = None,
+                 sample_rate: float = imu_sample_rate, frame_rate: float = default_frame_rate,
+                 device=None, queue_capacity: int = 256, overflow: str = OVERFLOW_DROP,
+                 session_dir: Optional[str] = None, filters=None, raw: bool = False):
+        self.sensorDataCollector = SensorDataCollector(device)
+        self.device = device
+        self.worker: Optional[AcquisitionWorker] = None
+        # history shared by every page, written once per sample
+        self.store = SampleStore(capacity, spill_dir)
+        # joint angles of every sample, the collector's imu is the shank (ankle) imu and there's no thigh imu yet,
+        # see KinematicsEngine.relativeQuaternions for what that means for the knee angles
+        self.kinematics = KinematicsEngine()
+        self.store.addRecordChannels(joint_angles_dtype, kinematics_prefix)
+        # quaternions the kinematics have been calibrated on so far this collection, see calibrateKinematics
+        self.calibrationQuaternions: List[np.ndarray] = []
+        self.calibrationSamples = max(1, int(calibration_seconds * sample_rate))
         self.subscribers: List[DataPageInterface]= []
+        # what each subscriber's callbacks are timed as when instrumentation is on
+        self.subscriberNames: Dict[DataPageInterface, str] = {}
+        # subscribers that currently get updateBatch, the rest are passive
+        self.activeSubscribers: Set[DataPageInterface] = set()
+        # passive subscribers that still get bufferBatch so they can catch up when shown again
+        self.bufferedSubscribers: Set[DataPageInterface] = set()
         self.activeTimer = False
+        self.sampleRate = sample_rate
+        self.frameRate = frame_rate
+        self.filters = filters
+        self.raw = raw
+        # batches acquired since the last frame, every collection gets a new queue so a worker that
+        # was still stuck in a read when it was stopped can never push into the next collection's
+        self.queueCapacity = queue_capacity
+        self.overflow = overflow
+        self.queue = SpscQueue(queue_capacity, overflow)
+
+        # acquisition timer, the number of samples read each tick is worked out from the elapsed time
+        # so the sample rate holds even when the timer fires late
         self.timer = QTimer()
-        self.timer.setInterval(200)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(max(1, int(1000 / sample_rate)))
         self.timer.timeout.connect(self.retrieveData)
+        self.renderTimer = QTimer()
+        self.renderTimer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.renderTimer.setInterval(max(1, int(1000 / frame_rate)))
+        self.renderTimer.timeout.connect(self.renderFrame)
+
+        self.startTime = 0.0
+        self.samplesAcquired = 0
+        self.lastFrameTime = 0.0
+        # frames that were due but never rendered because the previous one took too long
+        self.droppedFrames = 0
+        # samples waiting in the queue at the last frame, and the most ever seen
+        self.lagSamples = 0
+        self.maxLagSamples = 0
 
-    def subscribe(self, subscriber: DataPageInterface):
+        self.sessionDir = session_dir
+        self.sessionWriter: Optional[SessionWriter] = None
+        # samples recorded to the current session, their times are worked out from this and the sample rate
+        self.recordedSamples = 0
+
+    # subscribers start out active, passive subscribers do no work unless buffered is set
+    # pages may subscribe after collection started, buffered ones are handed the retained history first
+    # so they hold the same samples as a page that had been subscribed all along
+    def subscribe(self, subscriber: DataPageInterface, buffered: bool = False):
         self.subscribers.append(subscriber)
+        self.activeSubscribers.add(subscriber)
+        label = getattr(subscriber, 'label', None)
+        self.subscriberNames[subscriber] = type(subscriber).__name__ + (f' ({label})' if label else '')
+        if buffered:
+            self.bufferedSubscribers.add(subscriber)
+            if len(self.store):
+                subscriber.bufferBatch(ImuDataArray(self.store.records()))
+
+    def setActive(self, subscriber, active: bool):
+        if subscriber not in self.subscribers:
+            return
+        if active:
+            self.activeSubscribers.add(subscriber)
+        else:
+            self.activeSubscribers.discard(subscriber)
 
     def retrieveData(self):
-        data = self.sensorDataCollector.readData()
-        self.notifySubscribers(data)
+        due = int((time.perf_counter() - self.startTime) * self.sampleRate) - self.samplesAcquired
+        if due <= 0:
+            return
+        if instrumentation.enabled:
+            start = time.perf_counter_ns()
+            self.queue.push(self.sensorDataCollector.readBatch(due))
+            instrumentation.record('retrieveData', start, 'acquisition')
+        else:
+            self.queue.push(self.sensorDataCollector.readBatch(due))
+        self.samplesAcquired += due
+
+    def renderFrame(self):
+        if instrumentation.enabled:
+            start = time.perf_counter_ns()
+            self.publishFrame()
+            instrumentation.record('renderFrame', start)
+        else:
+            self.publishFrame()
+
+    def publishFrame(self):
+        if self.worker is not None and self.worker.error is not None:
+            self.acquisitionFailed(self.worker.error)
+            return
+        now = time.perf_counter()
+        if self.lastFrameTime:
+            self.droppedFrames += max(0, round((now - self.lastFrameTime) * self.frameRate) - 1)
+        self.lastFrameTime = now
+        batches = self.queue.popAll()
+        if not batches:
+            return
+        raw = batches[0] if len(batches) == 1 else ImuDataArray(np.concatenate([b.records for b in batches]))
+        self.lagSamples = len(raw)
+        self.maxLagSamples = max(self.maxLagSamples, self.lagSamples)
+        batch = raw
+        if self.filters is not None and not self.raw:
+            with instrumentation.span('filters', 'frame'):
+                batch = ImuDataArray(self.filters.process(raw.records))
+        with instrumentation.span('store.extendImu', 'frame'):
+            self.store.extendImu(batch.records)
+        with instrumentation.span('kinematics', 'frame'):
+            quaternions = imu_quaternions(batch.records)
+            self.calibrateKinematics(quaternions)
+            self.store.extendRecords(self.kinematics.process(quaternions), kinematics_prefix)
+        if self.sessionWriter is not None:
+            with instrumentation.span('recordBatch', 'frame'):
+                self.recordBatch(raw)
+        self.notifySubscribers(batch)
 
-    def notifySubscribers(self, data):
+    # recalibrates on every sample seen so far until calibration_seconds of them have been, so the angles
+    # are measured from the starting pose from the first frame on and settle as more of it comes in
+    # all-zero quaternions are from a sensor that hasn't fused yet and aren't a pose
+    def calibrateKinematics(self, quaternions: np.ndarray):
+        needed = self.calibrationSamples - sum(len(q) for q in self.calibrationQuaternions)
+        if needed <= 0:
+            return
+        valid = quaternions[quaternions.any(axis=1)][:needed]
+        if not len(valid):
+            return
+        self.calibrationQuaternions.append(valid)
+        self.kinematics.calibrate(np.concatenate(self.calibrationQuaternions))
+
+    def notifySubscribers(self, batch: ImuDataArray):
+        if instrumentation.enabled:
+            self.notifySubscribersTimed(batch)
+            return
+        for subscriber in self.subscribers:
+            if subscriber in self.activeSubscribers:
+                subscriber.updateBatch(batch)
+            elif subscriber in self.bufferedSubscribers:
+                subscriber.bufferBatch(batch)
+
+    # notifySubscribers with every callback timed under the subscriber's name
+    def notifySubscribersTimed(self, batch: ImuDataArray):
         for subscriber in self.subscribers:
-            subscriber.updateData(data)
+            name = self.subscriberNames[subscriber]
+            if subscriber in self.activeSubscribers:
+                start = time.perf_counter_ns()
+                subscriber.updateBatch(batch)
+                instrumentation.record(f'{name}.updateBatch', start, 'subscriber')
+            elif subscriber in self.bufferedSubscribers:
+                start = time.perf_counter_ns()
+                subscriber.bufferBatch(batch)
+                instrumentation.record(f'{name}.bufferBatch', start, 'subscriber')
+
+    # records every sample published from now on to a session file at path
+    def startRecording(self, path: str):
+        self.stopRecording()
+        self.sessionWriter = SessionWriter(path, metadata={'sampleRate': self.sampleRate, 'started': time.time()})
+        self.recordedSamples = 0
+
+    # finishes the session file, it can only be read back once it is closed
+    def stopRecording(self):
+        if self.sessionWriter is not None:
+            self.sessionWriter.close()
+            print(f"Recorded {self.recordedSamples} samples to {self.sessionWriter.path}")
+            self.sessionWriter = None
+
+    def recordBatch(self, batch: ImuDataArray):
+        records = np.zeros(len(batch), session_streams[session_imu_stream])
+        records['time'] = (self.recordedSamples + np.arange(len(batch))) / self.sampleRate
+        records['sample'] = batch.records
+        self.sessionWriter.write(session_imu_stream, records)
+        self.recordedSamples += len(batch)
 
     def toggleCollectData(self, exercise: str):
         if self.activeTimer:
             print(f"Data collection stopped for {exercise}")
-            self.timer.stop()
-            self.activeTimer = False
+            print(f"{self.droppedFrames} frames dropped, at most {self.maxLagSamples} samples behind")
+            self.stopCollecting()
         else:
+            # the last worker is still blocked in a device read, two can't read the device at once
+            if self.worker is not None and self.worker.is_alive():
+                print(f"Data collection not started for {exercise}, still waiting for the last read from the device")
+                return
+            self.worker = None
             print(f"Data collection started for {exercise}")
-            self.timer.start()
+            self.queue = SpscQueue(self.queueCapacity, self.overflow)
+            self.startTime = time.perf_counter()
+            self.samplesAcquired = 0
+            self.lastFrameTime = 0.0
+            self.droppedFrames = 0
+            self.lagSamples = 0
+            self.maxLagSamples = 0
+            self.kinematics.reset()
+            self.calibrationQuaternions = []
+            if self.filters is None and not self.raw:
+                from signal_filters import default_filter_pipeline
+                self.filters = default_filter_pipeline(self.sampleRate)
+            if self.filters is not None:
+                self.filters.reset()
+            if self.sessionDir is not None:
+                os.makedirs(self.sessionDir, exist_ok=True)
+                name = f"{exercise}-{time.strftime('%Y%m%d-%H%M%S')}{session_extension}"
+                self.startRecording(os.path.join(self.sessionDir, name))
+            if self.device is not None:
+                self.worker = AcquisitionWorker(self.sensorDataCollector, self.queue)
+                self.worker.start()
+            else:
+                self.timer.start()
+            self.renderTimer.start()
             self.activeTimer = True
+
+    # the samples still queued are published before the recording is finished, so they end up in this
+    # collection rather than at the start of the next one
+    # a worker that doesn't stop in time is kept, so the next collection can wait for it
+    def stopCollecting(self):
+        if self.worker is not None:
+            self.worker.stop()
+            if not self.worker.is_alive():
+                self.worker = None
+        self.timer.stop()
+        self.renderTimer.stop()
+        if len(self.queue):
+            self.renderFrame()
+        self.stopRecording()
+        self.activeTimer = False
+
+    # the worker's thread ended on a device error, collection stops with whatever was read before it
+    def acquisitionFailed(self, error: Exception):
+        print("Data collection stopped, reading from the device failed:")
+        traceback.print_exception(error)
+        self.worker = None
+        self.stopCollecting()
+
+    # for application shutdown, the device stays open between collections so a replay can be started again
+    def close(self):
+        self.stopCollecting()
+        self.sensorDataCollector.close()
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+import numpy as np
+
+# timing of the hot paths: publisher ticks, every subscriber callback and the expensive parts of the pages
+# everything is behind one global switch, while it is off the instrumented code only checks `enabled`
+#
+#   if instrumentation.enabled:                    with instrumentation.span('setData'):
+#       start = time.perf_counter_ns()                 line.setData(...)
+#       work()
+#       instrumentation.record('work', start)
+#
+# the first form is for the per-subscriber loops, the second for anything called once or twice a frame
+enabled = False
+
+# durations kept per name for the rolling percentiles
+default_window = 512
+# trace events kept for export, about a minute of a busy frame loop
+default_trace_events = 200000
+
+# one rolling window of durations in milliseconds
+class TimingStats:
+    def __init__(self, window: int = default_window):
+        self.durations: Deque[float] = deque(maxlen=window)
+        # calls ever recorded, the window only holds the newest
+        self.count = 0
+
+    def add(self, milliseconds: float):
+        self.durations.append(milliseconds)
+        self.count += 1
+
+    # (p50, p95, max) over the window
+    def summary(self) -> Tuple[float, float, float]:
+        if not self.durations:
+            return 0.0, 0.0, 0.0
+        values = np.fromiter(self.durations, dtype=np.float64, count=len(self.durations))
+        p50, p95 = np.percentile(values, [50, 95])
+        return float(p50), float(p95), float(values.max())
+
+stats: Dict[str, TimingStats] = {}
+# complete ("X") events in the Chrome trace event format
+trace_events: Deque[dict] = deque(maxlen=default_trace_events)
+# trace timestamps are relative to this so they stay small
+trace_origin_ns = time.perf_counter_ns()
+# names of the threads events were recorded on, for labelling their tracks in the trace
+thread_names: Dict[int, str] = {}
+
+def set_enabled(on: bool):
+    global enabled
+    enabled = on
+
+# records something that started at start_ns (from time.perf_counter_ns()) and ends now
+# safe to call from the acquisition thread, deque appends are atomic
+def record(name: str, start_ns: int, category: str = 'frame'):
+    end_ns = time.perf_counter_ns()
+    timing = stats.get(name)
+    if timing is None:
+        timing = stats.setdefault(name, TimingStats())
+    timing.add((end_ns - start_ns) / 1e6)
+    thread = threading.get_ident()
+    if thread not in thread_names:
+        thread_names[thread] = threading.current_thread().name
+    trace_events.append({
+        'name': name,
+        'cat': category,
+        'ph': 'X',
+        'ts': (start_ns - trace_origin_ns) / 1e3,
+        'dur': (end_ns - start_ns) / 1e3,
+        'pid': os.getpid(),
+        'tid': thread
+    })
+
+class Span:
+    __slots__ = ('name', 'category', 'start')
+
+    def __init__(self, name: str, category: str):
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        record(self.name, self.start, self.category)
+
+# shared by every span taken while instrumentation is off
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+null_span = NullSpan()
+
+def span(name: str, category: str = 'page'):
+    return Span(name, category) if enabled else null_span
+
+# (name, calls, p50, p95, max) for everything recorded, slowest p95 first
+def summary() -> List[Tuple[str, int, float, float, float]]:
+    rows = [(name, timing.count, *timing.summary()) for name, timing in list(stats.items())]
+    return sorted(rows, key=lambda row: row[3], reverse=True)
+
+def reset():
+    stats.clear()
+    trace_events.clear()
+
+# writes the recorded events as a Chrome trace, loadable in chrome://tracing and ui.perfetto.dev
+def export_trace(path: str):
+    events = list(trace_events)
+    pid = os.getpid()
+    metadata = [
+        {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+        for tid, name in list(thread_names.items())
+    ]
+    with open(path, 'w') as trace:
+        json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, trace)
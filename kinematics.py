@@ -0,0 +1,158 @@
+from typing import Optional, Tuple
+import numpy as np
+
+# joint angles from segment orientations, every function works on a whole batch of (w, x, y, z) quaternions at once
+#
+# segment frame: x points to the subject's right (the flexion axis), y anterior, z along the segment towards the
+# proximal joint; an IMU's quaternion rotates its own frame into the world frame (z up, as the BNO055 reports it)
+# and a segment's mounting rotates the segment frame into its IMU's frame, identity for an IMU strapped on with its
+# z axis along the segment and its y axis facing forward
+#
+# knee angles are the Cardan angles (x, then y, then z) of the shank in the thigh frame
+# ankle angles are the shank's tilt away from vertical, the foot is taken to be flat on the ground,
+# as it is through a squat or lunge, since there's no foot IMU
+
+identity_quaternion = np.array([1.0, 0.0, 0.0, 0.0])
+
+# degrees, positive is
+#   kneeFlexion:       the shank swinging back from the thigh
+#   kneeFrontal:       the shank rotating about the thigh's forward axis, varus on one leg and valgus on the other
+#   kneeRotation:      the shank turning about its own length
+#   ankleDorsiflexion: the shank leaning forward over the foot
+#   ankleFrontal:      the shank leaning towards the subject's right
+joint_angles_dtype = np.dtype([
+    ('kneeFlexion', '<f8'),
+    ('kneeFrontal', '<f8'),
+    ('kneeRotation', '<f8'),
+    ('ankleDorsiflexion', '<f8'),
+    ('ankleFrontal', '<f8'),
+])
+
+# (N, 4) quaternions of a batch of imu_dtype records
+def imu_quaternions(records: np.ndarray) -> np.ndarray:
+    fields = records['positionData']['quatOrientation']
+    quaternions = np.empty((len(records), 4))
+    for index, name in enumerate(('w', 'x', 'y', 'z')):
+        quaternions[:, index] = fields[name]
+    return quaternions
+
+# the components of (..., 4) quaternions as four arrays
+def quaternion_components(q: np.ndarray):
+    return q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+def quaternion_conjugate(q: np.ndarray) -> np.ndarray:
+    return q * np.array([1.0, -1.0, -1.0, -1.0])
+
+# Hamilton product of (..., 4) arrays, broadcast like any other numpy operation
+def quaternion_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    aw, ax, ay, az = quaternion_components(a)
+    bw, bx, by, bz = quaternion_components(b)
+    product = np.empty(np.broadcast_shapes(a.shape, b.shape))
+    product[..., 0] = aw * bw - ax * bx - ay * by - az * bz
+    product[..., 1] = aw * bx + ax * bw + ay * bz - az * by
+    product[..., 2] = aw * by - ax * bz + ay * bw + az * bx
+    product[..., 3] = aw * bz + ax * by - ay * bx + az * bw
+    return product
+
+# unit quaternions, the IMU reports them in 1/2^14 steps so they are never quite unit length
+# all-zero quaternions (a sensor that hasn't fused yet) become the identity
+def normalize_quaternions(q: np.ndarray) -> np.ndarray:
+    norms = np.sqrt(np.einsum('...i,...i->...', q, q))[..., None]
+    return np.where(norms > 0, q / np.where(norms > 0, norms, 1), identity_quaternion)
+
+# orientation of the segment frames from the IMU quaternions
+def segment_quaternions(imu: np.ndarray, mounting: np.ndarray = identity_quaternion) -> np.ndarray:
+    segments = normalize_quaternions(imu)
+    if mounting is identity_quaternion:
+        return segments
+    return quaternion_multiply(segments, mounting)
+
+# Cardan angles in degrees of rotations R = Rx(a) Ry(b) Rz(c), with a signed as flexion
+# a is in [-90, 270) so a knee bent past 180 doesn't jump to -180, b and c are in [-180, 180)
+def cardan_angles(q: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    w, x, y, z = quaternion_components(q)
+    r00 = 1 - 2 * (y * y + z * z)
+    r01 = 2 * (x * y - w * z)
+    r02 = 2 * (x * z + w * y)
+    r12 = 2 * (y * z - w * x)
+    r22 = 1 - 2 * (x * x + y * y)
+    flexion = np.degrees(np.arctan2(r12, r22))
+    flexion[flexion < -90] += 360
+    return flexion, np.degrees(np.arcsin(np.clip(r02, -1, 1))), np.degrees(np.arctan2(-r01, r00))
+
+# forward and rightward tilt in degrees of a segment's z axis away from world vertical
+def inclination_angles(q: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    w, x, y, z = quaternion_components(q)
+    # world up in the segment frame, the last row of the rotation matrix
+    up_x = 2 * (x * z - w * y)
+    up_y = 2 * (y * z + w * x)
+    up_z = 1 - 2 * (x * x + y * y)
+    return np.degrees(np.arctan2(-up_y, up_z)), np.degrees(np.arctan2(-up_x, up_z))
+
+# all-zero quaternions replaced by the last good one before them, `last` carries over from the previous batch
+def hold_last_valid(q: np.ndarray, last: np.ndarray) -> np.ndarray:
+    valid = q.any(axis=1)
+    if valid.all():
+        return q
+    # index of the last good row at or before each row, -1 before the first
+    source = np.maximum.accumulate(np.where(valid, np.arange(len(q)), -1))
+    return np.vstack([last[None], q])[source + 1]
+
+
+# joint angles of one leg from a stream of thigh and shank IMU quaternions, fed a batch at a time
+# keeps the neutral pose set by calibrate(), and the last good orientation of each segment so samples
+# where a sensor drops out (reports an all-zero quaternion) hold the previous angles instead of snapping to zero
+# until calibrate() is called the neutral pose is the world frame, DataViewPublisher calibrates at the start of every collection
+class KinematicsEngine:
+    def __init__(self, thigh_mounting: np.ndarray = identity_quaternion, shank_mounting: np.ndarray = identity_quaternion):
+        self.thigh_mounting = thigh_mounting
+        self.shank_mounting = shank_mounting
+        # shank orientation in the thigh frame and shank inclination while standing, angles are measured from these
+        self.knee_reference = identity_quaternion
+        self.ankle_reference = (0.0, 0.0)
+        self.reset()
+
+    # takes the mean pose of the given samples as standing straight, all angles are zero there
+    def calibrate(self, shank: np.ndarray, thigh: Optional[np.ndarray] = None):
+        relative = self.relativeQuaternions(shank, thigh)
+        # q and -q are the same rotation, line them all up with the first before averaging
+        relative = relative * np.where(relative @ relative[0] < 0, -1.0, 1.0)[:, None]
+        self.knee_reference = normalize_quaternions(relative.mean(axis=0))
+        forward, rightward = inclination_angles(segment_quaternions(shank, self.shank_mounting))
+        self.ankle_reference = (forward.mean(), rightward.mean())
+
+    # forgets the last good orientations, for the start of a new collection
+    def reset(self):
+        self.last_shank = identity_quaternion
+        self.last_thigh = identity_quaternion
+
+    # shank orientation in the thigh frame
+    # without a thigh IMU the thigh is taken to stay upright, so the knee angles are the shank's own orientation
+    def relativeQuaternions(self, shank: np.ndarray, thigh: Optional[np.ndarray] = None) -> np.ndarray:
+        shank_segment = segment_quaternions(shank, self.shank_mounting)
+        if thigh is None:
+            return shank_segment
+        return quaternion_multiply(quaternion_conjugate(segment_quaternions(thigh, self.thigh_mounting)), shank_segment)
+
+    # joint_angles_dtype records for a batch of (N, 4) shank and, if there is one, thigh quaternions
+    def process(self, shank: np.ndarray, thigh: Optional[np.ndarray] = None) -> np.ndarray:
+        angles = np.empty(len(shank), joint_angles_dtype)
+        if not len(shank):
+            return angles
+        shank = hold_last_valid(shank, self.last_shank)
+        self.last_shank = shank[-1]
+        if thigh is not None:
+            thigh = hold_last_valid(thigh, self.last_thigh)
+            self.last_thigh = thigh[-1]
+
+        shank_segment = segment_quaternions(shank, self.shank_mounting)
+        relative = shank_segment
+        if thigh is not None:
+            relative = quaternion_multiply(quaternion_conjugate(segment_quaternions(thigh, self.thigh_mounting)), relative)
+        if self.knee_reference is not identity_quaternion:
+            relative = quaternion_multiply(quaternion_conjugate(self.knee_reference), relative)
+        angles['kneeFlexion'], angles['kneeFrontal'], angles['kneeRotation'] = cardan_angles(relative)
+        forward, rightward = inclination_angles(shank_segment)
+        angles['ankleDorsiflexion'] = forward - self.ankle_reference[0]
+        angles['ankleFrontal'] = rightward - self.ankle_reference[1]
+        return angles
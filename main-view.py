@@ -5,25 +5,68 @@
 # menu to select exercise
 # plots
 
-from widgets import *
+import time
+launchTime = time.perf_counter()
+
+import argparse
+import sys
+from typing import Callable, Dict, List, Tuple
+import widgets
+from widgets import DataPageInterface, HomePage, MenuBar, RenderStatsLabel
 from data_view_publisher import DataViewPublisher
+from sensor_data_collector import FakeImuDevice, SessionReplayDevice
+from acquisition import OVERFLOW_BLOCK, OVERFLOW_DROP
+import instrumentation
 from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QWidget
-from PyQt6.QtCore import Qt
-import sys
+from PyQt6.QtCore import Qt, QTimer
+
+# modules that should not be loaded before the home screen is up
+deferred_modules = ['pyqtgraph', 'matplotlib', 'OpenGL', 'scipy']
+
+# records how long each step of startup took, printed with --startup-report
+class StartupReport:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.last = launchTime
+        self.steps: List[Tuple[str, float]] = []
+
+    def mark(self, step: str):
+        now = time.perf_counter()
+        self.steps.append((step, now - self.last))
+        self.last = now
+
+    def print(self):
+        if not self.enabled:
+            return
+        print('startup report:')
+        for step, seconds in self.steps:
+            print(f'  {step:<28}{seconds * 1000:8.1f} ms')
+        print(f'  {"home screen shown":<28}{(self.last - launchTime) * 1000:8.1f} ms')
+        loaded = [module for module in deferred_modules if module in sys.modules]
+        print(f'  deferred modules loaded: {", ".join(loaded) if loaded else "none"}')
+
+    # pages are built on first show, after startup, so their cost is reported on its own
+    def pageBuilt(self, name: str, seconds: float):
+        if self.enabled:
+            print(f'built {name} page in {seconds * 1000:.1f} ms')
 
 class Page:
-    def __init__(self, dataSource: DataViewPublisher):
+    def __init__(self, dataSource: DataViewPublisher, startupReport: StartupReport):
         # source of data for the view
         self.dataSource = dataSource
+        self.startupReport = startupReport
 
         # making the window
         self.app = QApplication(sys.argv)
+        # stops any collection in progress and closes the device, e.g. the session file being replayed
+        self.app.aboutToQuit.connect(self.dataSource.close)
         self.window = QWidget()
         self.window.setFixedSize(1000, 800)
         self.layout = QVBoxLayout()
         self.layout.setAlignment(Qt.AlignmentFlag.AlignTop)
         self.window.setWindowTitle("Smart Wearable Exercise Activity Trainer (SWEAT)")
         self.pages = []
+        self.startupReport.mark('application')
 
         # making the menu
         self.setUpMenu()
@@ -37,68 +80,107 @@ class Page:
         # showing the window
         self.window.setLayout(self.layout)
         self.window.show()
+        self.startupReport.mark('window shown')
+        # the first pass through the event loop is when the home screen is actually painted
+        QTimer.singleShot(0, self.homeScreenShown)
+
+    def homeScreenShown(self):
+        self.startupReport.mark('first paint')
+        self.startupReport.print()
     
     # switch to the provided page
+    # hidden pages are passive subscribers and do no drawing, the shown page catches up in one refresh
     def showPage(self, page):
         for p in self.pages:
             if p != page:
                 p.hide()
                 p.visible = False
+                self.dataSource.setActive(p, False)
         page.show()
         page.visible = True
-        try:
-            page.updateLines()
-        except:
-            pass
-        # if page == self.rawDataPage:
-        #     self.rawDataPage.visible = True
-        #     # self.rawDataPage.update_graphs()
-        #     self.rawDataPage.updateLines()
-        # else:
-        #     self.rawDataPage.visible = False
+        self.dataSource.setActive(page, True)
+        if isinstance(page, DataPageInterface):
+            page.refresh()
 
     # start the application
     def startApp(self):
         self.app.exec()
     
     # set up the pages and connect them to their corresponding buttons
+    # only the home page is built up front, the data pages are built the first time they are shown
     def setUpPages(self):
         self.homePage = HomePage()
-        self.feedbackPage = FeedbackPage(self.dataSource, visible=False)
-        self.ankleImuPage = ImuRawDataPage(self.dataSource, visible=False, label='Ankle')
-        self.kneeImuPage = ImuRawDataPage(self.dataSource, visible=False, label='Knee')
-        self.kneeAnglePage = FlexSensorRawDataPage(self.dataSource, visible=False, label='Angle')
-        self.feetDataPage = ForceRawDataPage(self.dataSource, visible=False, label='Feet')
-        # self.rawDataPage = RawDataPage(self.dataSource, visible=False)
-        self.pages += [
-            self.homePage,
-            self.feedbackPage,
-            self.ankleImuPage,
-            self.kneeImuPage,
-            self.kneeAnglePage,
-            self.feetDataPage
-        ]
-
-        for page in self.pages:
-            self.layout.addWidget(page)
+        self.pages.append(self.homePage)
+        self.layout.addWidget(self.homePage)
+        self.startupReport.mark('home page')
+
+        self.pageFactories: Dict[str, Callable[[], QWidget]] = {
+            'feedback': lambda: widgets.FeedbackPage(self.dataSource, visible=False),
+            'ankleImu': lambda: widgets.ImuRawDataPage(self.dataSource, visible=False, label='Ankle'),
+            'kneeImu': lambda: widgets.ImuRawDataPage(self.dataSource, visible=False, label='Knee'),
+            'kneeAngle': lambda: widgets.FlexSensorRawDataPage(self.dataSource, visible=False, label='Angle'),
+            'feetData': lambda: widgets.ForceRawDataPage(self.dataSource, visible=False, label='Feet'),
+            'timing': lambda: widgets.TimingPage(self.dataSource, visible=False),
+            'rawData': lambda: widgets.RawDataPage(self.dataSource, visible=False),
+        }
+        self.builtPages: Dict[str, QWidget] = {}
 
+        self.menuBar.homeButton.clicked.connect(lambda _: self.showPage(self.homePage))
         button_to_page = {
-            self.menuBar.homeButton: self.homePage,
-            self.menuBar.feedbackButton: self.feedbackPage,
-            self.menuBar.ankleImuDataButton: self.ankleImuPage,
-            self.menuBar.kneeImuDataButton: self.kneeImuPage,
-            self.menuBar.kneeAngleDataButton: self.kneeAnglePage,
-            self.menuBar.feetDataButton: self.feetDataPage
+            self.menuBar.feedbackButton: 'feedback',
+            self.menuBar.ankleImuDataButton: 'ankleImu',
+            self.menuBar.kneeImuDataButton: 'kneeImu',
+            self.menuBar.kneeAngleDataButton: 'kneeAngle',
+            self.menuBar.feetDataButton: 'feetData',
+            self.menuBar.rawDataButton: 'rawData',
+            self.menuBar.timingButton: 'timing'
         }
 
         for button, currentPage in button_to_page.items():
-            button.clicked.connect(lambda _, page = currentPage: self.showPage(page))
+            button.clicked.connect(lambda _, name = currentPage: self.showPage(self.getPage(name)))
+
+    # the named page, built and subscribed on first use
+    # pages read their history out of the publisher's store, so a page built late still shows everything collected so far
+    def getPage(self, name: str) -> QWidget:
+        if name not in self.builtPages:
+            start = time.perf_counter()
+            page = self.pageFactories[name]()
+            self.builtPages[name] = page
+            self.pages.append(page)
+            self.layout.addWidget(page)
+            self.startupReport.pageBuilt(name, time.perf_counter() - start)
+        return self.builtPages[name]
 
     # set up the menu of buttons
     def setUpMenu(self):
         self.menuBar = MenuBar()
+        self.renderStats = RenderStatsLabel(self.dataSource)
+        self.menuBar.layout().addWidget(self.renderStats)
         self.layout.addWidget(self.menuBar)
+        self.startupReport.mark('menu')
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--startup-report', action='store_true', help='print how long startup took')
+parser.add_argument('--record', metavar='DIR', help='record every collection to a session file in DIR')
+parser.add_argument('--replay', metavar='SESSION', help='replay a recorded session instead of the sample log')
+parser.add_argument('--replay-speed', default='1', help='replay speed, 1 is real time, max is as fast as possible')
+parser.add_argument('--timing', action='store_true', help='record hot path timings from the start, see the Timing page')
+parser.add_argument('--raw', action='store_true', help='show the samples unfiltered, see signal_filters.py')
+# anything else is left for Qt
+args, _ = parser.parse_known_args()
 
-dataSource = DataViewPublisher()
-page = Page(dataSource)
+startupReport = StartupReport(args.startup_report)
+instrumentation.set_enabled(args.timing)
+startupReport.mark('imports')
+# no IMU hardware is wired up yet, the fake device replays the sample log in real time
+if args.replay:
+    speed = None if args.replay_speed == 'max' else float(args.replay_speed)
+    device = SessionReplayDevice(args.replay, speed=speed)
+else:
+    device = FakeImuDevice()
+# replaying as fast as possible waits for the pages rather than dropping samples
+overflow = OVERFLOW_BLOCK if args.replay and args.replay_speed == 'max' else OVERFLOW_DROP
+dataSource = DataViewPublisher(device=device, overflow=overflow, session_dir=args.record, raw=args.raw)
+startupReport.mark('data source')
+page = Page(dataSource, startupReport)
 page.startApp()
\ No newline at end of file
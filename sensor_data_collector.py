@@ -1,22 +1,185 @@
+import os
 import struct
+import time
+from typing import Optional
+import numpy as np
 from data_structures import *
+from session_file import SessionReader
 
 imu_struct_format = "< 18d 4d 3d 4B"
 sample_data_file_path = 'sample_data/imu_data.bin'
+# rate the IMU writes fused records at, used to map between time and record index
+imu_sample_rate = 100
 
 imu_struct_size = struct.calcsize(imu_struct_format)
+assert imu_dtype.itemsize == imu_struct_size
 
 # example data collector
 class SensorDataCollector:
 
-    def __init__(self):
-        self.sensor = None
-        self.data_generator = read_bin_chunks(sample_data_file_path)
+    # without a device, readBatch replays the sample log
+    def __init__(self, device=None):
+        self.sensor = device
+        # the whole log is decoded up front, samples are built lazily as they are read
+        self.samples = read_imu_file(sample_data_file_path)
+        self.position = 0
+        # bytes of a record the device hasn't finished sending
+        self.pending = b''
 
     def readData(self):
-        data = read_data(self.data_generator)
+        data = self.readBatch(1)[0]
         return data
 
+    # next `count` samples, the sample log is replayed in a loop
+    def readBatch(self, count: int) -> ImuDataArray:
+        if not len(self.samples):
+            return ImuDataArray(np.empty(0, dtype=imu_dtype))
+        indices = (self.position + np.arange(count)) % len(self.samples)
+        self.position = (self.position + count) % len(self.samples)
+        return ImuDataArray(self.samples.records[indices])
+
+    # called when acquisition starts, a device that paces itself on a clock starts it again from now
+    def start(self):
+        self.pending = b''
+        if hasattr(self.sensor, 'restart'):
+            self.sensor.restart()
+
+    # blocks until the device sends something or timeout passes, returns every complete record received
+    def readAvailable(self, timeout: float = 0.1) -> ImuDataArray:
+        data = self.pending + self.sensor.read(timeout)
+        usable = len(data) - len(data) % imu_struct_size
+        self.pending = data[usable:]
+        return unpack_imu_array(data[:usable])
+
+    # releases the device, devices that hold a file or port open have a close()
+    def close(self):
+        if hasattr(self.sensor, 'close'):
+            self.sensor.close()
+
+
+# stands in for the IMU when no hardware is attached, replays a recorded log in a loop at the rate it was recorded
+# like a serial port buffer, records left unread for longer than max_backlog seconds are lost
+class FakeImuDevice:
+    def __init__(self, filepath=sample_data_file_path, sample_rate: float = imu_sample_rate, max_backlog: float = 1.0):
+        self.records = read_imu_file(filepath).records
+        self.sample_rate = sample_rate
+        self.max_backlog = max_backlog
+        self.start_time = None
+        self.sent = 0
+        # record sent first since the clock was last started
+        self.start_record = 0
+
+    # picks up from the next record as if it had just been switched on, rather than sending
+    # everything that would have been due while nothing was reading
+    def restart(self):
+        self.start_time = None
+        self.start_record = self.sent
+
+    # blocks until at least one record is due or timeout passes, returns the bytes of every record that is due
+    def read(self, timeout: float = 0.1) -> bytes:
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        due = self.start_record + int((time.perf_counter() - self.start_time) * self.sample_rate)
+        if due <= self.sent:
+            next_record_time = self.start_time + (self.sent + 1 - self.start_record) / self.sample_rate
+            time.sleep(max(0.0, min(timeout, next_record_time - time.perf_counter())))
+            due = self.start_record + int((time.perf_counter() - self.start_time) * self.sample_rate)
+        self.sent = max(self.sent, due - int(self.max_backlog * self.sample_rate))
+        indices = np.arange(self.sent, due) % len(self.records)
+        self.sent = max(self.sent, due)
+        return self.records[indices].tobytes()
+
+# stands in for the IMU by replaying one imu stream of a recorded session
+# speed scales the recorded timing (1 is real time, 4 is four times as fast), None replays as fast as the reader
+# keeps up, one chunk per read; pair that with OVERFLOW_BLOCK on the publisher so no samples are dropped
+class SessionReplayDevice:
+    def __init__(self, filepath, stream: str = 'ankleImu', speed: Optional[float] = 1.0):
+        self.reader = SessionReader(filepath)
+        self.stream = stream
+        self.speed = speed
+        self.start_time = None
+        self.first, self.last = self.reader.timeRange(stream)
+        # session time everything before has been sent, or the next chunk when replaying as fast as possible
+        self.sent_until = self.first
+        self.next_chunk = 0
+        # session time the replay clock was last started at
+        self.start_from = self.first
+
+    # carries on from where the last collection stopped instead of catching up on the time in between
+    def restart(self):
+        self.start_time = None
+        self.start_from = self.sent_until
+
+    # blocks until a record is due or timeout passes, returns the bytes of every record that is due
+    # once the session is over every read waits out its timeout and returns nothing
+    def read(self, timeout: float = 0.1) -> bytes:
+        if self.speed is None:
+            if self.next_chunk == len(self.reader.chunks[self.stream]):
+                time.sleep(timeout)
+                return b''
+            records = self.reader.chunk(self.stream, self.next_chunk)
+            self.next_chunk += 1
+            return records['sample'].tobytes()
+
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        due_until = self.start_from + (time.perf_counter() - self.start_time) * self.speed
+        records = self.reader.read(self.stream, self.sent_until, due_until)
+        if not len(records):
+            time.sleep(min(timeout, 1 / (imu_sample_rate * self.speed)))
+            due_until = self.start_from + (time.perf_counter() - self.start_time) * self.speed
+            records = self.reader.read(self.stream, self.sent_until, due_until)
+        self.sent_until = max(self.sent_until, due_until)
+        return records['sample'].tobytes()
+
+    def close(self):
+        self.reader.close()
+
+# random access over a recorded IMU log without reading it into memory
+# records are fixed size so record N always starts at N * imu_struct_size, no separate index is needed
+class ImuLogReader:
+    def __init__(self, filepath, sample_rate: float = imu_sample_rate):
+        self.filepath = filepath
+        self.sample_rate = sample_rate
+        count = os.path.getsize(filepath) // imu_struct_size
+        # np.memmap can't map an empty file
+        if count:
+            self.records = np.memmap(filepath, dtype=imu_dtype, mode='r', shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=imu_dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    # an int returns an ImuRecord, a slice returns a zero-copy view of the mapped records
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.records[index]
+        # the single record is copied out so it stays valid after close()
+        return ImuRecord(self.records[[index]], 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # time in seconds of a record relative to the start of the log
+    def timeAt(self, index: int) -> float:
+        return index / self.sample_rate
+
+    # index of the record at a time in seconds, clamped to the log
+    def indexAt(self, seconds: float) -> int:
+        return min(max(int(seconds * self.sample_rate), 0), len(self.records))
+
+    # zero-copy view of the records in [start, end) seconds
+    def timeRange(self, start: float, end: float) -> np.ndarray:
+        return self.records[self.indexAt(start):self.indexAt(end)]
+
+    # the mapping is released once the last view into it is gone
+    def close(self):
+        self.records = np.empty(0, dtype=imu_dtype)
+
 
 def read_bin_chunks(filepath, chunk_size=struct.calcsize(imu_struct_format)):
     with open(filepath, "rb") as bin_file:
@@ -28,6 +191,17 @@ def read_data(data_generator):
         imudata = unpack_imu_data(data)
         return imudata
 
+# decodes every complete record in a file in one call
+def read_imu_file(filepath) -> ImuDataArray:
+    with open(filepath, "rb") as bin_file:
+        return unpack_imu_array(bin_file.read())
+
+# decodes a buffer of back-to-back records into a structured array, trailing partial records are ignored
+def unpack_imu_array(binary_data) -> ImuDataArray:
+    count = len(binary_data) // imu_struct_size
+    records = np.frombuffer(binary_data, dtype=imu_dtype, count=count)
+    return ImuDataArray(records)
+
 def unpack_imu_data(binary_data):
     if len(binary_data) != imu_struct_size:
         raise ValueError("Invalid binary data size")
@@ -0,0 +1,214 @@
+import json
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from numpy.lib.format import descr_to_dtype, dtype_to_descr
+from data_structures import *
+from data_store import channel_field, dtype_channels
+
+# a session file holds every stream recorded during one collection
+#   header:  magic, format version
+#   chunks:  zlib-compressed blocks of one stream's rows, stored column by column so similar values sit together
+#   footer:  JSON index of each stream's dtype and the offset, size, row count and time span of each of its chunks
+#   trailer: footer length, magic
+# opening a session only reads the footer, chunks are decompressed when a time range inside them is read
+session_magic = b'SWEATSES'
+session_version = 1
+session_header = struct.Struct('<8sI')
+session_trailer = struct.Struct('<Q8s')
+session_extension = '.sweat'
+
+# rows buffered per stream before they are compressed into a chunk, 10 seconds of imu data
+default_chunk_rows = 1000
+default_compression_level = 6
+
+# every stream row starts with its time in seconds since the recording started
+def timed_dtype(dtype) -> np.dtype:
+    return np.dtype([('time', '<f8'), ('sample', dtype)])
+
+# flex sensor knee angles in degrees
+flex_dtype = np.dtype([('left', '<f8'), ('right', '<f8')])
+# eight-point insole pressure, 0-1 per sensor in the order of force_data_page.left_foot_pressure_points
+pressure_dtype = np.dtype([('left', '<f4', (8,)), ('right', '<f4', (8,))])
+
+session_streams: Dict[str, np.dtype] = {
+    'ankleImu': timed_dtype(imu_dtype),
+    'kneeImu': timed_dtype(imu_dtype),
+    'flex': timed_dtype(flex_dtype),
+    'pressure': timed_dtype(pressure_dtype),
+}
+
+def encode_chunk(records: np.ndarray, level: int = default_compression_level) -> bytes:
+    columns = [np.ascontiguousarray(channel_field(records, channel)).tobytes() for channel in dtype_channels(records.dtype)]
+    return zlib.compress(b''.join(columns), level)
+
+def decode_chunk(payload: bytes, dtype: np.dtype, count: int) -> np.ndarray:
+    data = zlib.decompress(payload)
+    records = np.zeros(count, dtype)
+    offset = 0
+    for channel in dtype_channels(dtype):
+        field = channel_field(records, channel)
+        field[...] = np.frombuffer(data, field.dtype, count=field.size, offset=offset).reshape(field.shape)
+        offset += field.nbytes
+    return records
+
+
+# writes a session file, rows are written per stream in time order
+class SessionWriter:
+    def __init__(self, path: str, streams: Dict[str, np.dtype] = session_streams, chunk_rows: int = default_chunk_rows,
+                 compression_level: int = default_compression_level, metadata: Optional[dict] = None):
+        self.path = path
+        self.streams = dict(streams)
+        self.chunk_rows = chunk_rows
+        self.compression_level = compression_level
+        self.metadata = metadata or {}
+        self.pending: Dict[str, List[np.ndarray]] = {stream: [] for stream in self.streams}
+        self.pending_rows: Dict[str, int] = {stream: 0 for stream in self.streams}
+        self.chunks: Dict[str, List[dict]] = {stream: [] for stream in self.streams}
+        self.file = open(path, 'wb')
+        self.file.write(session_header.pack(session_magic, session_version))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, stream: str, records: np.ndarray):
+        if records.dtype != self.streams[stream]:
+            raise ValueError(f'{stream} rows must have dtype {self.streams[stream]}, got {records.dtype}')
+        if not len(records):
+            return
+        self.pending[stream].append(records)
+        self.pending_rows[stream] += len(records)
+        if self.pending_rows[stream] >= self.chunk_rows:
+            self.flush(stream, full_chunks_only=True)
+
+    # compresses a stream's buffered rows into chunks, a partial last chunk is kept back unless this is the end
+    def flush(self, stream: str, full_chunks_only: bool = False):
+        if not self.pending[stream]:
+            return
+        records = np.concatenate(self.pending[stream])
+        end = len(records) - len(records) % self.chunk_rows if full_chunks_only else len(records)
+        for start in range(0, end, self.chunk_rows):
+            self.writeChunk(stream, records[start:min(start + self.chunk_rows, end)])
+        self.pending[stream] = [records[end:]] if end < len(records) else []
+        self.pending_rows[stream] = len(records) - end
+
+    def writeChunk(self, stream: str, records: np.ndarray):
+        payload = encode_chunk(records, self.compression_level)
+        self.chunks[stream].append({
+            'offset': self.file.tell(),
+            'size': len(payload),
+            'count': len(records),
+            'start': float(records['time'][0]),
+            'end': float(records['time'][-1])
+        })
+        self.file.write(payload)
+
+    def close(self):
+        if self.file is None:
+            return
+        for stream in self.streams:
+            self.flush(stream)
+        footer = json.dumps({
+            'version': session_version,
+            'metadata': self.metadata,
+            'streams': {
+                stream: {'dtype': dtype_to_descr(dtype), 'chunks': self.chunks[stream]}
+                for stream, dtype in self.streams.items()
+            }
+        }).encode()
+        self.file.write(footer)
+        self.file.write(session_trailer.pack(len(footer), session_magic))
+        self.file.close()
+        self.file = None
+
+
+# random access by time over a session file
+# recently decompressed chunks are kept so scrubbing back and forth doesn't decompress the same chunk again
+class SessionReader:
+    def __init__(self, path: str, cached_chunks: int = 16):
+        self.path = path
+        self.file = open(path, 'rb')
+        magic, version = session_header.unpack(self.file.read(session_header.size))
+        if magic != session_magic:
+            raise ValueError(f'{path} is not a session file')
+        if version > session_version:
+            raise ValueError(f'{path} is session format version {version}, only up to {session_version} is supported')
+        self.file.seek(-session_trailer.size, 2)
+        footer_size, magic = session_trailer.unpack(self.file.read(session_trailer.size))
+        if magic != session_magic:
+            raise ValueError(f'{path} has no index, the recording was not closed')
+        self.file.seek(-session_trailer.size - footer_size, 2)
+        footer = json.loads(self.file.read(footer_size))
+
+        self.metadata: dict = footer['metadata']
+        self.streams: Dict[str, np.dtype] = {}
+        self.chunks: Dict[str, List[dict]] = {}
+        # per stream, time of the first and last row of each chunk and the row each chunk starts at
+        self.chunk_starts: Dict[str, np.ndarray] = {}
+        self.chunk_ends: Dict[str, np.ndarray] = {}
+        self.chunk_rows: Dict[str, np.ndarray] = {}
+        for stream, entry in footer['streams'].items():
+            chunks = entry['chunks']
+            self.streams[stream] = descr_to_dtype(entry['dtype'])
+            self.chunks[stream] = chunks
+            self.chunk_starts[stream] = np.array([chunk['start'] for chunk in chunks])
+            self.chunk_ends[stream] = np.array([chunk['end'] for chunk in chunks])
+            self.chunk_rows[stream] = np.cumsum([0] + [chunk['count'] for chunk in chunks])
+        self.cached_chunks = cached_chunks
+        self.cache: OrderedDict[Tuple[str, int], np.ndarray] = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # number of rows recorded for a stream
+    def count(self, stream: str) -> int:
+        return int(self.chunk_rows[stream][-1])
+
+    # time of the first and last row of a stream, (0, 0) if nothing was recorded
+    def timeRange(self, stream: str) -> Tuple[float, float]:
+        if not self.chunks[stream]:
+            return 0.0, 0.0
+        return float(self.chunk_starts[stream][0]), float(self.chunk_ends[stream][-1])
+
+    def chunk(self, stream: str, index: int) -> np.ndarray:
+        key = (stream, index)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        entry = self.chunks[stream][index]
+        self.file.seek(entry['offset'])
+        records = decode_chunk(self.file.read(entry['size']), self.streams[stream], entry['count'])
+        self.cache[key] = records
+        if len(self.cache) > self.cached_chunks:
+            self.cache.popitem(last=False)
+        return records
+
+    # rows with start <= time < end, only the chunks overlapping the range are decompressed
+    def read(self, stream: str, start: float = -np.inf, end: float = np.inf) -> np.ndarray:
+        first = int(np.searchsorted(self.chunk_ends[stream], start, 'left'))
+        last = int(np.searchsorted(self.chunk_starts[stream], end, 'left'))
+        if first >= last:
+            return np.zeros(0, self.streams[stream])
+        records = np.concatenate([self.chunk(stream, index) for index in range(first, last)])
+        times = records['time']
+        return records[np.searchsorted(times, start, 'left'):np.searchsorted(times, end, 'left')]
+
+    # the last row at or before a time, None before the first row
+    def rowAt(self, stream: str, seconds: float) -> Optional[np.void]:
+        index = int(np.searchsorted(self.chunk_starts[stream], seconds, 'right')) - 1
+        if index < 0:
+            return None
+        records = self.chunk(stream, index)
+        return records[int(np.searchsorted(records['time'], seconds, 'right')) - 1]
+
+    def close(self):
+        self.cache.clear()
+        self.file.close()
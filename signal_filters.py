@@ -0,0 +1,190 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+from data_store import channel_field
+
+# filters run on the imu samples between the collector and the store, a frame's batch at a time
+# each filter works on its own list of channels and keeps its state between batches, so filtering a stream
+# batch by batch gives the same result as filtering it all at once
+# the state starts out as if the first sample had always been there, so there's no ramp up from zero
+#
+#   pipeline = FilterPipeline([
+#       SpikeRejection(['gyroData.x', 'gyroData.y', 'gyroData.z']),
+#       BiquadFilter(['gyroData.x', 'gyroData.y', 'gyroData.z'], 'lowpass', cutoff=15, sample_rate=100),
+#   ])
+#   filtered = pipeline.process(records)
+
+# the channels the publisher filters by default, the raw sensor readings
+# linear acceleration, gravity and orientation come out of the IMU's own fusion and are left alone
+default_filter_channels = [f'{vector}.{axis}' for vector in ['accelData', 'gyroData', 'magData'] for axis in ['x', 'y', 'z']]
+default_cutoff = 20.0
+
+
+# (N, channels) array of some channels of a batch of records
+def read_channels(records: np.ndarray, channels: List[str]) -> np.ndarray:
+    values = np.empty((len(records), len(channels)))
+    for index, channel in enumerate(channels):
+        values[:, index] = channel_field(records, channel)
+    return values
+
+def write_channels(records: np.ndarray, channels: List[str], values: np.ndarray):
+    for index, channel in enumerate(channels):
+        channel_field(records, channel)[...] = values[:, index]
+
+
+class SignalFilter(ABC):
+    def __init__(self, channels: List[str]):
+        self.channels = channels
+
+    # filters the channels of a batch of records in place
+    def apply(self, records: np.ndarray):
+        write_channels(records, self.channels, self.filter(read_channels(records, self.channels)))
+
+    # (N, channels) in, (N, channels) out
+    @abstractmethod
+    def filter(self, values: np.ndarray) -> np.ndarray:
+        pass
+
+    # forgets the state, the next batch starts a new stream
+    def reset(self):
+        pass
+
+
+# second order Butterworth low-pass or high-pass
+class BiquadFilter(SignalFilter):
+    def __init__(self, channels: List[str], kind: str, cutoff: float, sample_rate: float):
+        super().__init__(channels)
+        if kind not in ('lowpass', 'highpass'):
+            raise ValueError(f'Unknown biquad kind {kind}')
+        self.kind = kind
+        self.sos = signal.butter(2, cutoff, btype=kind, fs=sample_rate, output='sos')
+        # state of each section for each channel, (sections, 2, channels)
+        self.state: Optional[np.ndarray] = None
+
+    def filter(self, values: np.ndarray) -> np.ndarray:
+        if self.state is None:
+            # steady state for a constant input, a high-pass settles to zero rather than the first sample
+            steady = signal.sosfilt_zi(self.sos)[:, :, None]
+            self.state = steady * values[0] if self.kind == 'lowpass' else np.zeros(steady.shape[:2] + values.shape[1:])
+        filtered, self.state = signal.sosfilt(self.sos, values, axis=0, zi=self.state)
+        return filtered
+
+    def reset(self):
+        self.state = None
+
+
+# mean of the last `window` samples
+class MovingAverage(SignalFilter):
+    def __init__(self, channels: List[str], window: int):
+        super().__init__(channels)
+        self.window = window
+        self.b = np.full(window, 1 / window)
+        self.state: Optional[np.ndarray] = None
+
+    def filter(self, values: np.ndarray) -> np.ndarray:
+        if self.state is None:
+            self.state = signal.lfilter_zi(self.b, [1.0])[:, None] * values[0]
+        filtered, self.state = signal.lfilter(self.b, [1.0], values, axis=0, zi=self.state)
+        return filtered
+
+    def reset(self):
+        self.state = None
+
+
+# replaces samples further than `threshold` scaled median absolute deviations from the median of the last
+# `window` samples with that median (a causal Hampel filter), so one-sample glitches never reach the plots
+# a window that is flat or quantized to one level has no deviation, any change of more than `min_change` from it is a spike,
+# so a real step out of a flat stretch is held back for window // 2 samples until it is most of the window
+# until a stream has filled its first window the median and deviation are only taken over the samples it has had
+class SpikeRejection(SignalFilter):
+    def __init__(self, channels: List[str], window: int = 5, threshold: float = 3.0, min_change: float = 1e-6):
+        super().__init__(channels)
+        self.window = window
+        self.threshold = threshold
+        self.min_change = min_change
+        # the last window - 1 samples of the previous batch, padded with the first sample at the start of a stream
+        self.history: Optional[np.ndarray] = None
+        # how many of the history's samples are real rather than padding
+        self.filled = 0
+
+    def filter(self, values: np.ndarray) -> np.ndarray:
+        if self.history is None:
+            self.history = np.repeat(values[:1], self.window - 1, axis=0)
+            self.filled = 0
+        extended = np.concatenate([self.history, values])
+        self.history = extended[len(extended) - (self.window - 1):]
+        windows = sliding_window_view(extended, self.window, axis=0)
+        medians = np.median(windows, axis=-1)
+        # 1.4826 scales the MAD to a standard deviation for normally distributed noise
+        deviations = 1.4826 * np.median(np.abs(windows - medians[..., None]), axis=-1)
+        # the first few windows of a stream still hold padding, they're worked out over their real samples only
+        for row in range(min(self.window - 1 - self.filled, len(values))):
+            real = windows[row, ..., self.window - (self.filled + row + 1):]
+            medians[row] = np.median(real, axis=-1)
+            deviations[row] = 1.4826 * np.median(np.abs(real - medians[row][..., None]), axis=-1)
+        self.filled = min(self.filled + len(values), self.window - 1)
+        spikes = np.abs(values - medians) > np.maximum(self.threshold * deviations, self.min_change)
+        return np.where(spikes, medians, values)
+
+    def reset(self):
+        self.history = None
+
+
+# blends angles with the integral of their rates: the integrated rate is trusted over short times and the
+# angle over long ones, angle = alpha * (angle + rate * dt) + (1 - alpha) * measured angle
+# angle_channels are replaced with the blend, rate_channels are the matching rates in angle units per second
+# the angles must not wrap around (roll and pitch, not a 0-360 heading)
+class ComplementaryFilter(SignalFilter):
+    def __init__(self, angle_channels: List[str], rate_channels: List[str], alpha: float, sample_rate: float):
+        super().__init__(angle_channels)
+        if len(angle_channels) != len(rate_channels):
+            raise ValueError('Every angle channel needs a rate channel')
+        self.rate_channels = rate_channels
+        self.alpha = alpha
+        self.dt = 1 / sample_rate
+        self.state: Optional[np.ndarray] = None
+
+    def apply(self, records: np.ndarray):
+        write_channels(records, self.channels, self.filter(read_channels(records, self.channels + self.rate_channels)))
+
+    # (N, angle channels + rate channels) in, the angles then the rates, (N, angle channels) out
+    def filter(self, values: np.ndarray) -> np.ndarray:
+        angles, rates = np.split(values, 2, axis=1)
+        # the recursion is a one pole filter over alpha * rate * dt + (1 - alpha) * angle,
+        # its state is alpha times the last output, so the first sample starts from the first measured angle
+        if self.state is None:
+            self.state = self.alpha * angles[:1]
+        inputs = self.alpha * self.dt * rates + (1 - self.alpha) * angles
+        blended, self.state = signal.lfilter([1.0], [1.0, -self.alpha], inputs, axis=0, zi=self.state)
+        return blended
+
+    def reset(self):
+        self.state = None
+
+
+# runs filters in order over batches of imu_dtype records
+class FilterPipeline:
+    def __init__(self, filters: List[SignalFilter]):
+        self.filters = filters
+
+    # a filtered copy of the records, the records passed in are left as they are
+    def process(self, records: np.ndarray) -> np.ndarray:
+        records = records.copy()
+        if len(records):
+            for signal_filter in self.filters:
+                signal_filter.apply(records)
+        return records
+
+    def reset(self):
+        for signal_filter in self.filters:
+            signal_filter.reset()
+
+# spike rejection followed by a low-pass on the raw sensor readings
+def default_filter_pipeline(sample_rate: float, channels: List[str] = default_filter_channels,
+                            cutoff: float = default_cutoff) -> FilterPipeline:
+    return FilterPipeline([
+        SpikeRejection(channels),
+        BiquadFilter(channels, 'lowpass', min(cutoff, 0.45 * sample_rate), sample_rate),
+    ])
@@ -0,0 +1,83 @@
+# run from the repository root:
+#   python -m pytest tests
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acquisition import AcquisitionWorker, OVERFLOW_BLOCK, OVERFLOW_DROP, SpscQueue
+from sensor_data_collector import FakeImuDevice, SensorDataCollector, imu_sample_rate, unpack_imu_array
+
+
+# hands out one-sample batches as fast as it's asked, or raises once it has handed out `fail_after`
+class FastCollector:
+    def __init__(self, fail_after=None):
+        self.reads = 0
+        self.fail_after = fail_after
+
+    def start(self):
+        pass
+
+    def readAvailable(self, timeout):
+        if self.fail_after is not None and self.reads >= self.fail_after:
+            raise OSError('device unplugged')
+        self.reads += 1
+        return np.zeros(1)
+
+
+def test_drop_counts_what_doesnt_fit():
+    queue = SpscQueue(capacity=2, overflow=OVERFLOW_DROP)
+    assert [queue.push(item) for item in range(4)] == [True, True, False, False]
+    assert queue.dropped == 2
+    assert queue.popAll() == [0, 1]
+    assert queue.push(4) and queue.popAll() == [4]
+
+def test_block_waits_for_room():
+    queue = SpscQueue(capacity=2, overflow=OVERFLOW_BLOCK)
+    queue.push(0)
+    queue.push(1)
+    pushed = threading.Event()
+    producer = threading.Thread(target=lambda: queue.push(2) and pushed.set())
+    producer.start()
+    assert not pushed.wait(0.05)
+    assert queue.popAll() == [0, 1]
+    producer.join(1)
+    assert pushed.is_set() and queue.popAll() == [2] and queue.dropped == 0
+
+def test_stop_while_blocked_on_a_full_queue():
+    queue = SpscQueue(capacity=4, overflow=OVERFLOW_BLOCK)
+    worker = AcquisitionWorker(FastCollector(), queue)
+    worker.start()
+    while len(queue) < queue.capacity:
+        time.sleep(0.001)
+    start = time.perf_counter()
+    worker.stop()
+    assert not worker.is_alive()
+    assert time.perf_counter() - start < 0.5
+    assert worker.error is None
+
+def test_device_error_is_kept():
+    worker = AcquisitionWorker(FastCollector(fail_after=3), SpscQueue())
+    worker.start()
+    worker.join(1)
+    assert not worker.is_alive()
+    assert isinstance(worker.error, OSError)
+    assert len(worker.queue) == 3
+
+# a collection started after a pause doesn't open with the records that would have been due during it
+def test_fake_device_restart_has_no_backlog():
+    device = FakeImuDevice()
+    collector = SensorDataCollector(device)
+    collector.start()
+    collector.readAvailable(0.05)
+    time.sleep(0.3)
+    collector.start()
+    assert len(collector.readAvailable(0.05)) < 0.1 * imu_sample_rate
+
+def test_empty_log_reads_nothing():
+    collector = SensorDataCollector()
+    collector.samples = unpack_imu_array(b'')
+    assert len(collector.readBatch(5)) == 0
@@ -0,0 +1,65 @@
+# run from the repository root:
+#   python -m pytest tests
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kinematics import KinematicsEngine, quaternion_multiply
+
+
+# (w, x, y, z) rotation of `degrees` about a unit axis
+def rotation(axis, degrees: float) -> np.ndarray:
+    half = np.radians(degrees) / 2
+    return np.concatenate([[np.cos(half)], np.sin(half) * np.asarray(axis, dtype=float)])
+
+def angles_of(engine: KinematicsEngine, *quaternions) -> np.ndarray:
+    return engine.process(np.array(quaternions))
+
+
+# the shank's top tilting forward (its z axis towards +y) is a rotation of minus the angle about x,
+# it's a bent knee and a shank leaning over the foot
+def test_forward_tilt_is_positive_flexion_and_dorsiflexion():
+    angles = angles_of(KinematicsEngine(), rotation([1, 0, 0], -30))[0]
+    assert np.isclose(angles['kneeFlexion'], 30)
+    assert np.isclose(angles['ankleDorsiflexion'], 30)
+    for name in ['kneeFrontal', 'kneeRotation', 'ankleFrontal']:
+        assert np.isclose(angles[name], 0, atol=1e-9)
+
+def test_sideways_tilt_is_frontal():
+    # z towards +x, the subject's right
+    angles = angles_of(KinematicsEngine(), rotation([0, 1, 0], 20))[0]
+    assert np.isclose(angles['kneeFrontal'], 20)
+    assert np.isclose(angles['ankleFrontal'], 20)
+    assert np.isclose(angles['kneeFlexion'], 0, atol=1e-9)
+
+def test_opposite_quaternions_give_the_same_angles():
+    q = quaternion_multiply(rotation([1, 0, 0], -40), rotation([0, 0, 1], 15))
+    engine = KinematicsEngine()
+    angles = angles_of(engine, q, -q)
+    for name in angles.dtype.names:
+        assert np.isclose(angles[name][0], angles[name][1])
+
+# a sensor dropping out reports all zeros, the angles hold across the batch boundary instead of snapping to zero
+def test_dropout_holds_the_previous_angles_across_batches():
+    engine = KinematicsEngine()
+    first = angles_of(engine, rotation([1, 0, 0], -50))
+    second = angles_of(engine, np.zeros(4), np.zeros(4), rotation([1, 0, 0], -20))
+    assert np.isclose(second['kneeFlexion'][0], first['kneeFlexion'][0])
+    assert np.isclose(second['kneeFlexion'][1], 50)
+    assert np.isclose(second['kneeFlexion'][2], 20)
+    assert np.isclose(second['ankleDorsiflexion'][1], 50)
+
+def test_calibration_zeroes_the_neutral_pose():
+    neutral = quaternion_multiply(rotation([1, 0, 0], -10), rotation([0, 0, 1], 25))
+    wobble = quaternion_multiply(neutral, rotation([1, 1, 0] / np.sqrt(2), 2))
+    engine = KinematicsEngine()
+    # q and -q are the same pose, calibrating has to line them up before averaging
+    engine.calibrate(np.array([neutral, -neutral, wobble, -wobble]))
+    angles = angles_of(engine, neutral)[0]
+    for name in angles.dtype.names:
+        assert abs(angles[name]) < 1.5
+    # bending from the neutral pose is measured from it
+    bent = angles_of(engine, quaternion_multiply(neutral, rotation([1, 0, 0], -30)))[0]
+    assert abs(bent['kneeFlexion'] - 30) < 1.5
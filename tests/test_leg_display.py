@@ -0,0 +1,74 @@
+# the leg renderer headless, drawn into an EGL pbuffer (Mesa's llvmpipe works)
+# skipped when no EGL display can be had
+import ctypes
+import os
+import sys
+import numpy as np
+import pytest
+
+# has to be set before Qt and PyOpenGL are imported
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+size = 200
+
+
+# makes an EGL pbuffer context current, like benchmarks/throughput.py does
+@pytest.fixture(scope='module')
+def gl_context():
+    try:
+        from OpenGL import EGL
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        if not EGL.eglInitialize(display, None, None):
+            pytest.skip('no EGL display')
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        attributes = (EGL.EGLint * 9)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_DEPTH_SIZE, 16, EGL.EGL_NONE
+        )
+        if not EGL.eglChooseConfig(display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count)) or not count.value:
+            pytest.skip('no EGL pbuffer config')
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+        surface = EGL.eglCreatePbufferSurface(display, config, (EGL.EGLint * 5)(EGL.EGL_WIDTH, size, EGL.EGL_HEIGHT, size, EGL.EGL_NONE))
+        if not EGL.eglMakeCurrent(display, surface, surface, context):
+            pytest.skip('EGL context could not be made current')
+    except Exception as error:
+        pytest.skip(f'no GL context: {error}')
+    from PyQt6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    yield app
+    EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+    EGL.eglDestroySurface(display, surface)
+    EGL.eglDestroyContext(display, context)
+
+
+def red_pixels() -> int:
+    from OpenGL.GL import glFinish, glReadPixels, GL_RGB, GL_UNSIGNED_BYTE
+    glFinish()
+    pixels = np.frombuffer(glReadPixels(0, 0, size, size, GL_RGB, GL_UNSIGNED_BYTE), np.uint8).reshape(size, size, 3)
+    return int(((pixels[..., 0] > 128) & (pixels[..., 1] < 128)).sum())
+
+
+def test_leg_display_paints_and_releases_its_buffer(gl_context):
+    from OpenGL.GL import glIsBuffer
+    from widgets.leg_display import LegDisplay
+    display = LegDisplay()
+    # no QOpenGLContext behind a context made outside Qt, initializeGL must still work
+    display.initializeGL()
+    display.resizeGL(size, size)
+    display.updatePoints([[-0.5, -0.5], [0.5, 0.5], [-0.5, 0.5], [0.5, -0.5]])
+    display.paintGL()
+    assert red_pixels() > 0
+    vbo = display.renderer.vbo
+    assert vbo is not None and glIsBuffer(vbo)
+
+    # a no-op without a QOpenGLContext, the caller releases the renderer on its own context
+    display.cleanupGL()
+    assert display.renderer.vbo == vbo
+    display.renderer.cleanup()
+    assert display.renderer.vbo is None and not glIsBuffer(vbo)
@@ -0,0 +1,70 @@
+# run from the repository root:
+#   python -m pytest tests
+import os
+import sys
+import numpy as np
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication
+from data_store import SampleStore
+from data_structures import imu_dtype
+from widgets.sample_history import SampleHistoryModel
+
+app = QApplication.instance() or QApplication([])
+
+
+# `count` records numbered from `start`, accelData.x is the sample number and gyroData.x repeats so sorting has ties
+def numbered_records(start: int, count: int) -> np.ndarray:
+    records = np.zeros(count, imu_dtype)
+    numbers = np.arange(start, start + count)
+    records['accelData']['x'] = numbers
+    records['gyroData']['x'] = numbers % 7
+    return records
+
+def shown_samples(model: SampleHistoryModel) -> list:
+    return [model.headerData(row, Qt.Orientation.Vertical) for row in range(model.rowCount())]
+
+
+# the store fills and drops its oldest samples, a synced order has to match sorting everything again
+@pytest.mark.parametrize('column, order', [
+    (0, Qt.SortOrder.AscendingOrder),
+    (0, Qt.SortOrder.DescendingOrder),
+    (2, Qt.SortOrder.AscendingOrder),
+    (2, Qt.SortOrder.DescendingOrder),
+])
+def test_sync_merges_like_a_full_sort(column, order):
+    store = SampleStore(capacity=50)
+    live = SampleHistoryModel(channels=['accelData.x', 'gyroData.x'])
+    live.setStore(store)
+    live.setThreshold('accelData.x', 5, None)
+    live.sort(column, order)
+    for start in range(0, 120, 13):
+        store.extendImu(numbered_records(start, 13))
+        live.sync()
+        fresh = SampleHistoryModel(channels=['accelData.x', 'gyroData.x'])
+        fresh.setStore(store)
+        fresh.setThreshold('accelData.x', 5, None)
+        fresh.sort(column, order)
+        assert shown_samples(live) == shown_samples(fresh)
+
+# cells read between syncs show the sample their row was synced with, even once the store has moved its buffers
+def test_cells_follow_the_store_between_syncs():
+    store = SampleStore(capacity=20)
+    model = SampleHistoryModel(channels=['accelData.x'])
+    model.setStore(store)
+    store.extendImu(numbered_records(0, 20))
+    model.sync()
+    for start in range(20, 45, 5):
+        store.extendImu(numbered_records(start, 5))
+        for row in range(model.rowCount()):
+            sample = int(model.headerData(row, Qt.Orientation.Vertical))
+            index = model.sampleIndex(row)
+            if index < 0:
+                assert model.data(model.index(row, 1)) is None
+            else:
+                assert float(model.data(model.index(row, 1))) == sample
+                assert store.view('accelData.x')[index] == sample
@@ -0,0 +1,75 @@
+# run from the repository root:
+#   python -m pytest tests
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from signal_filters import BiquadFilter, ComplementaryFilter, MovingAverage, SpikeRejection
+
+
+def reject(values, **kwargs) -> np.ndarray:
+    return SpikeRejection(['value'], **kwargs).filter(np.asarray(values, dtype=float)[:, None])[:, 0]
+
+
+# a glitch on a steady signal leaves the window with no deviation, it still has to be caught
+def test_spike_on_flat_signal():
+    assert np.array_equal(reject([1, 1, 1, 1, 100, 1, 1, 1]), np.ones(8))
+
+def test_spike_on_quantized_signal():
+    trace = np.full(12, 3 / 16)
+    trace[6] = 5
+    assert np.array_equal(reject(trace), np.full(12, 3 / 16))
+
+# the padding a stream starts with isn't taken as samples, so a stream that starts out moving passes untouched
+def test_ramp_is_kept():
+    values = np.linspace(0, 5, 50)
+    assert np.array_equal(reject(values), values)
+
+# a real step out of a flat stretch looks like a spike until it is most of the window
+def test_step_is_held_back_half_a_window():
+    values = np.repeat([0.0, 1.0], 10)
+    filtered = reject(values, window=5)
+    assert np.array_equal(filtered, np.repeat([0.0, 1.0], [12, 8]))
+
+# filtering batch by batch, starting with batches shorter than a window, is the same as filtering everything at once
+def in_batches(make_filter, values: np.ndarray) -> np.ndarray:
+    signal_filter = make_filter()
+    sizes = [1, 2, 1] + [17] * (len(values) // 17 + 1)
+    starts = np.cumsum([0] + sizes)
+    return np.concatenate([signal_filter.filter(values[start:end]) for start, end in zip(starts, starts[1:]) if start < len(values)])
+
+def noisy_channels() -> np.ndarray:
+    values = np.random.default_rng(0).normal(size=(200, 3)) + np.arange(3)
+    values[[20, 90, 150]] += 40
+    return values
+
+def test_spike_rejection_batches_match_whole_stream():
+    values = noisy_channels()
+    whole = SpikeRejection(['a', 'b', 'c']).filter(values)
+    assert np.array_equal(in_batches(lambda: SpikeRejection(['a', 'b', 'c']), values), whole)
+
+@pytest.mark.parametrize('kind', ['lowpass', 'highpass'])
+def test_biquad_batches_match_whole_stream(kind):
+    values = noisy_channels()
+    make_filter = lambda: BiquadFilter(['a', 'b', 'c'], kind, cutoff=10, sample_rate=100)
+    assert np.allclose(in_batches(make_filter, values), make_filter().filter(values))
+
+def test_moving_average_batches_match_whole_stream():
+    values = noisy_channels()
+    make_filter = lambda: MovingAverage(['a', 'b', 'c'], window=8)
+    whole = make_filter().filter(values)
+    assert np.allclose(in_batches(make_filter, values), whole)
+    # the state starts out as if the first sample had always been there, no ramp up from zero
+    assert np.allclose(whole[0], values[0])
+    assert np.allclose(whole[7], values[:8].mean(axis=0))
+
+def test_complementary_batches_match_whole_stream():
+    # angles then rates, side by side
+    values = noisy_channels()[:, :2]
+    make_filter = lambda: ComplementaryFilter(['angle'], ['rate'], alpha=0.98, sample_rate=100)
+    whole = make_filter().filter(values)
+    assert np.allclose(in_batches(make_filter, values), whole)
+    assert np.isclose(whole[0, 0], 0.98 * (values[0, 0] + values[0, 1] / 100) + 0.02 * values[0, 0])
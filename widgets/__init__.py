@@ -1,8 +1,25 @@
+import importlib
 from .data_page_interface import DataPageInterface
-from .feedback_page import FeedbackPage
 from .home_page import HomePage
-from .menu_bar import MenuBar
-from .raw_data_page import RawDataPage
-from .imu_raw_data_page import ImuRawDataPage
-from .flex_sensor_raw_data_page import FlexSensorRawDataPage
-from .force_data_page import ForceRawDataPage
\ No newline at end of file
+from .menu_bar import MenuBar, RenderStatsLabel
+
+# the data pages pull in pyqtgraph, matplotlib and OpenGL, so their modules are only imported on first use
+# e.g. `widgets.FeedbackPage` or `from widgets import FeedbackPage` imports widgets.feedback_page at that point
+lazy_page_modules = {
+    'FeedbackPage': '.feedback_page',
+    'RawDataPage': '.raw_data_page',
+    'ImuRawDataPage': '.imu_raw_data_page',
+    'FlexSensorRawDataPage': '.flex_sensor_raw_data_page',
+    'ForceRawDataPage': '.force_data_page',
+    'TimingPage': '.timing_page',
+}
+
+def __getattr__(name: str):
+    if name in lazy_page_modules:
+        value = getattr(importlib.import_module(lazy_page_modules[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(list(globals()) + list(lazy_page_modules))
@@ -4,4 +4,19 @@ from PyQt6.QtWidgets import QWidget
 class DataPageInterface(QWidget):
     @abstractmethod
     def updateData(self):
+        pass
+
+    # called once per frame with every sample received since the last frame
+    # pages that can redraw once for the whole batch should override this
+    def updateBatch(self, samples):
+        for data in samples:
+            self.updateData(data)
+
+    # called instead of updateBatch while the page is hidden, if it subscribed as buffered
+    # only cheap bookkeeping belongs here, no drawing
+    def bufferBatch(self, samples):
+        pass
+
+    # brings the page up to date in one go when it is shown again
+    def refresh(self):
         pass
\ No newline at end of file
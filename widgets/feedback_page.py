@@ -3,9 +3,9 @@ from widgets import DataPageInterface
 from style_sheets import *
 from PyQt6.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QWidget, QPushButton, QLabel, QButtonGroup, QRadioButton, QTextEdit
 from PyQt6.QtCore import Qt
-from PyQt6.QtOpenGLWidgets import QOpenGLWidget
-from widgets.leg_display import LegDisplay, FrontLegFunctions, SideLegFunctions
+from widgets.leg_display import MultiLegDisplay, FrontLegFunctions, SideLegFunctions, PoseMeshCache
 import random
+import instrumentation
 
 class FeedbackPage(DataPageInterface):
     def __init__(self, dataSource: DataViewPublisher, visible: bool = False):
@@ -55,22 +55,17 @@ class FeedbackPage(DataPageInterface):
 
     def createVisualizationBox(self):
         visualizationBox = QWidget(self)
-        frontvisualizationbox = QWidget(self)
-        sidevisualizationbox = QWidget(self)
         layout = QVBoxLayout(visualizationBox)
-        toplayout = QHBoxLayout(frontvisualizationbox)
-        sidelayout = QHBoxLayout(sidevisualizationbox)
-        self.parent = QOpenGLWidget()
 
-        self.leftfrontlegfunctions = FrontLegFunctions()
-        self.rightfrontlegfunctions = FrontLegFunctions()
-        self.leftfrontview = LegDisplay(self.parent)
-        self.rightfrontview = LegDisplay(self.parent)
+        # one cache for all four views, so the left and right front views share meshes too
+        self.meshcache = PoseMeshCache()
+        self.leftfrontlegfunctions = FrontLegFunctions(cache=self.meshcache)
+        self.rightfrontlegfunctions = FrontLegFunctions(cache=self.meshcache)
+        self.leftsidelegfunctions = SideLegFunctions('left', cache=self.meshcache)
+        self.rightsidelegfunctions = SideLegFunctions('right', cache=self.meshcache)
 
-        self.leftsidelegfunctions = SideLegFunctions('left')
-        self.rightsidelegfunctions = SideLegFunctions('right')
-        self.leftsideview = LegDisplay(self.parent)
-        self.rightsideview = LegDisplay(self.parent)
+        # all four views share one GL surface: front views on top, side views below, left on the left
+        self.legview = MultiLegDisplay(rows=2, cols=2)
 
         leftlabel = QLabel("Left")
         leftlabel.setAlignment(Qt.AlignmentFlag.AlignHCenter)
@@ -84,13 +79,8 @@ class FeedbackPage(DataPageInterface):
         labellayout.addWidget(leftlabel)
         labellayout.addWidget(rightlabel)
 
-        toplayout.addWidget(self.leftfrontview)
-        toplayout.addWidget(self.rightfrontview)
-        sidelayout.addWidget(self.leftsideview)
-        sidelayout.addWidget(self.rightsideview)
         layout.addWidget(labelbox)
-        layout.addWidget(frontvisualizationbox)
-        layout.addWidget(sidevisualizationbox)
+        layout.addWidget(self.legview)
         layout.setSpacing(10)
         visualizationBox.setMinimumHeight(700)
         visualizationBox.setStyleSheet(VISUALIZATION_BOX_STYLE_SHEET)
@@ -125,32 +115,45 @@ class FeedbackPage(DataPageInterface):
         if self.selectedExercise is None:
             self.feedBackText.append("No exercise was selected")
             return
-        elif self.startButton.text() == "Start":
+        elif not self.dataSource.activeTimer:
             self.feedBackText.clear()
-            self.startButton.setText("Stop")
-        else:
-            self.startButton.setText("Start")
         self.dataSource.toggleCollectData(self.selectedExercise)
+        # collection may not have started, or may have stopped on its own after a device error
+        self.startButton.setText("Stop" if self.dataSource.activeTimer else "Start")
 
-    def updateData(self, data):
-        # do something with updated data
-        num = random.randint(90,180)
-        num2 = random.uniform(-1,1)
-
-        self.leftfrontlegfunctions.updateLeg(num,90,num2)
-        self.leftfrontview.updatePoints(self.leftfrontlegfunctions.getPoints())
-        self.leftfrontview.update()
+    # the legs only show the newest pose
+    def updateBatch(self, samples):
+        if len(samples):
+            self.updateData(samples[-1])
 
-        self.rightfrontlegfunctions.updateLeg(num,90,num2)
-        self.rightfrontview.updatePoints(self.rightfrontlegfunctions.getPoints())
-        self.rightfrontview.update()
+    def refresh(self):
+        store = self.dataSource.store
+        if len(store):
+            self.updateData(store.imuDataAt(-1))
 
-        self.leftsidelegfunctions.updateLeg(num,90,num2)
-        self.leftsideview.updatePoints(self.leftsidelegfunctions.getPoints())
-        self.leftsideview.update()
-
-        self.rightsidelegfunctions.updateLeg(num,90,num2)
-        self.rightsideview.updatePoints(self.rightsidelegfunctions.getPoints())
-        self.rightsideview.update()
+    def updateData(self, data):
+        # the publisher has already worked out the joint angles of this sample
+        store = self.dataSource.store
+        knee_flexion = store.latest('kinematics.kneeFlexion')
+        ankle_dorsiflexion = store.latest('kinematics.ankleDorsiflexion')
+        ankle_frontal = store.latest('kinematics.ankleFrontal')
+        # the legs are drawn from 180 (straight) down to 90 degrees at the knee, with the foot at 90 to the shank
+        knee_deg = min(max(180 - knee_flexion, 90), 180)
+        # no insoles yet, so the centre of mass is still simulated
+        num2 = random.uniform(-1,1)
 
-        self.feedBackText.append("simulated data returned -- knee angle: " + str(num) + " | foot com: " + str(num2))
\ No newline at end of file
+        # one imu for now, so both legs show the same angles
+        # the front views show the ankle's medial/lateral angle, the side views its posterior/anterior angle
+        legfunctions = [
+            (self.leftfrontlegfunctions, 90 - ankle_frontal),
+            (self.rightfrontlegfunctions, 90 - ankle_frontal),
+            (self.leftsidelegfunctions, 90 - ankle_dorsiflexion),
+            (self.rightsidelegfunctions, 90 - ankle_dorsiflexion)
+        ]
+        with instrumentation.span('FeedbackPage.getPoints'):
+            for index, (functions, ankle_deg) in enumerate(legfunctions):
+                functions.updateLeg(knee_deg, ankle_deg, num2)
+                self.legview.updateView(index, functions.getPoints())
+        self.legview.update()
+
+        self.feedBackText.append(f"knee flexion: {knee_flexion:.1f} | ankle dorsiflexion: {ankle_dorsiflexion:.1f} | simulated foot com: {num2:.2f}")
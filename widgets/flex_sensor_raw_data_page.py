@@ -2,19 +2,24 @@ from PyQt6.QtWidgets import QGridLayout, QLabel, QTableWidget, QVBoxLayout, QHBo
 from PyQt6.QtCore import Qt
 from widgets import DataPageInterface
 from data_view_publisher import DataViewPublisher
+from widgets.plot_ranges import visible_sample_range
+import numpy as np
 import pyqtgraph as pg
+import instrumentation
 from data_structures import *
-import random
 from typing import List, Dict
 
 class FlexSensorRawDataPage(DataPageInterface):
   def __init__(self, data_source: DataViewPublisher, label: str, visible: bool = False):
     super().__init__()
     self.data_source = data_source
-    self.data_source.subscribe(self)
     self.visible = visible
     self.label = label
+    self.store = data_source.store
+    # store count when the lines were last drawn
+    self.drawn_count = 0
     self.setup()
+    self.data_source.subscribe(self)
 
   def setup(self):
     layout = QGridLayout(self)
@@ -44,9 +49,11 @@ class FlexSensorRawDataPage(DataPageInterface):
     self.initializeLines()
 
   def initializeLines(self):
-    self.plot_data = {
-      'left': [],
-      'right': []
+    # until the flex sensors are read the angle is the knee flexion worked out from the imu,
+    # there's only the one imu so both sides show it
+    self.plot_channels: Dict[str, str] = {
+      'left': 'kinematics.kneeFlexion',
+      'right': 'kinematics.kneeFlexion'
     }
     self.plot_items = {
       'left': self.left_angle_plot.getPlotItem(),
@@ -54,21 +61,38 @@ class FlexSensorRawDataPage(DataPageInterface):
     }
     self.plot_lines: Dict[str, pg.PlotDataItem] = {}
     for side, plot_item in self.plot_items.items():
+      plot_item.getViewBox().sigRangeChangedManually.connect(lambda *_: self.redrawLines())
       self.plot_lines[side] = plot_item.plot(
-        y=self.plot_data[side],
+        y=self.store.view(self.plot_channels[side]),
         pen=pg.mkPen(color='r', width=3),
         width=5
       )
 
+  # the publisher has already written the sample's angles to the shared store
   def updateData(self, data: ImuData):
-    # ignoring imu data for now
-    self.plot_data['left'].append(random.uniform(0, 90))
-    self.plot_data['right'].append(random.uniform(0, 90))
     if self.visible:
       self.updateLines()
 
-  def updateLines(self):
-    for side, lines in self.plot_lines.items():
-      lines.setData(y=self.plot_data[side])
+  # lines are drawn from the store, so a batch costs the same single redraw as one sample
+  def updateBatch(self, samples):
+    if self.visible and len(samples):
+      self.updateLines()
+
+  # the store kept the history while the page was hidden
+  def refresh(self):
+    self.updateLines()
 
+  def updateLines(self):
+    count = self.store.count
+    if count == self.drawn_count:
+      return
+    self.drawn_count = count
+    with instrumentation.span('FlexSensorRawDataPage.setData'):
+      # the whole history is drawn as a min/max envelope, so short spikes in the angle survive
+      for side, lines in self.plot_lines.items():
+        x, y = self.store.envelope(self.plot_channels[side], *visible_sample_range(self.plot_items[side]))
+        lines.setData(x=x, y=y, skipFiniteCheck=True)
 
+  def redrawLines(self):
+    self.drawn_count = -1
+    self.updateLines()
@@ -1,4 +1,4 @@
-from PyQt6.QtWidgets import QGraphicsSimpleTextItem, QGraphicsTextItem, QGraphicsEllipseItem, QGridLayout, QLabel, QTableWidget, QVBoxLayout, QHBoxLayout, QHeaderView, QTableWidgetItem
+from PyQt6.QtWidgets import QCheckBox, QGraphicsSimpleTextItem, QGraphicsTextItem, QGraphicsEllipseItem, QGridLayout, QLabel, QTableWidget, QVBoxLayout, QHBoxLayout, QHeaderView, QTableWidgetItem
 from PyQt6.QtCore import Qt, QPointF
 from PyQt6.QtGui import QRadialGradient, QColor, QBrush, QPen, QFont, QTransform
 from sensor_data_collector import SensorDataCollector
@@ -8,7 +8,7 @@ from data_structures import *
 from typing import Dict
 import numpy as np
 import pyqtgraph as pg
-import random
+import instrumentation
 
 
 left_foot_pressure_points = [
@@ -27,13 +27,69 @@ ellipse_height = 236.78
 mini_ellipse_width = 20
 mini_ellipse_height = 32
 
-grid_size = 400
+# number of distinct pressure colours, pressures are quantized to this many levels
+pressure_levels = 256
+
+# heatmap pixels per plot unit, and how far (in plot units) each sensor's pressure spreads
+heatmap_resolution = 1.0
+heatmap_spread = 18.0
+# interpolation weights smaller than this are dropped from the weight matrix
+heatmap_min_weight = 1e-3
+
+
+# interpolates the eight insole pressures over the inside of the insole ellipse
+# the weights from each sensor to each pixel inside the ellipse are worked out once as a sparse matrix,
+# so a frame only costs one sparse mat-vec and a lookup table
+class InsoleHeatmap:
+  def __init__(self, resolution: float = heatmap_resolution, spread: float = heatmap_spread):
+    # pixel centres, symmetric about x = 0 so the right foot is the left foot's image mirrored
+    columns = int(np.ceil(ellipse_width * resolution))
+    rows = int(np.ceil(ellipse_height * resolution))
+    x = (np.arange(columns) + 0.5) / resolution - columns / resolution / 2
+    y = (np.arange(rows) + 0.5) / resolution - rows / resolution / 2
+    grid_x, grid_y = np.meshgrid(x, y, indexing='ij')
+    inside = (grid_x / (ellipse_width / 2))**2 + (grid_y / (ellipse_height / 2))**2 <= 1
+    self.shape = inside.shape
+    self.rect = pg.QtCore.QRectF(-columns / resolution / 2, -rows / resolution / 2, columns / resolution, rows / resolution)
+    # flat image index of every pixel inside the insole
+    self.pixels = np.flatnonzero(inside)
+
+    # gaussian falloff from each sensor, rows scaled down where sensors overlap so values stay within [0, 1]
+    points = np.array(left_foot_pressure_points)
+    dx = grid_x.ravel()[self.pixels, None] - points[None, :, 0]
+    dy = grid_y.ravel()[self.pixels, None] - points[None, :, 1]
+    weights = np.exp(-(dx**2 + dy**2) / (2 * spread**2))
+    weights /= np.maximum(weights.sum(axis=1, keepdims=True), 1)
+    # sparse (pixel, sensor, weight) triplets
+    self.rows, self.sensors = np.nonzero(weights >= heatmap_min_weight)
+    self.weights = weights[self.rows, self.sensors].astype(np.float32)
+
+    # one image per foot, ImageItem.setImage keeps the array it's given rather than a copy
+    self.images = {mirror: np.zeros(self.shape, dtype=np.uint8) for mirror in (False, True)}
+
+  # uint8 image of lookup table indices: 0 outside the insole, 1-255 for pressures 0-1 inside it
+  # the returned image is reused by the next render for the same foot
+  def render(self, pressures, mirror: bool = False) -> np.ndarray:
+    values = np.bincount(self.rows, weights=self.weights * np.asarray(pressures)[self.sensors], minlength=len(self.pixels))
+    image = self.images[mirror]
+    image.ravel()[self.pixels] = 1 + np.rint(np.clip(values, 0, 1) * 254).astype(np.uint8)
+    return image[::-1] if mirror else image
+
+  # transparent outside the insole, white to red inside it
+  @staticmethod
+  def lookupTable() -> np.ndarray:
+    cmap = pg.ColorMap([0.0, 1.0], [pg.mkColor(255,255,255), pg.mkColor(255,0,0)])
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    lut[1:] = cmap.getLookupTable(nPts=255, alpha=True)
+    return lut
 
 
 class ForceRawDataPage(DataPageInterface):
-  def __init__(self, data_source: DataViewPublisher, label: str, visible: bool = False):
+  # heatmap starts the page showing the interpolated heatmap rather than the pressure points
+  def __init__(self, data_source: DataViewPublisher, label: str, visible: bool = False, heatmap: bool = False):
     super().__init__()
     self.label = label
+    self.heatmap = heatmap
     self.sensor_data_collector = SensorDataCollector()
     self.data_source = data_source
     self.data_source.subscribe(self)
@@ -71,10 +127,13 @@ class ForceRawDataPage(DataPageInterface):
       'right': {}
     }
     # add pressure points and labels
+    # each ellipse is centred on its own origin and moved into place, so one set of gradient brushes fits all of them
     for idx, point in enumerate(left_foot_pressure_points):
       x, y = point
-      ellipse_left = QGraphicsEllipseItem(x - mini_ellipse_width / 2, y - mini_ellipse_height / 2, mini_ellipse_width, mini_ellipse_height)
-      ellipse_right = QGraphicsEllipseItem(-x - mini_ellipse_width / 2, y - mini_ellipse_height / 2, mini_ellipse_width, mini_ellipse_height)
+      ellipse_left = QGraphicsEllipseItem(-mini_ellipse_width / 2, -mini_ellipse_height / 2, mini_ellipse_width, mini_ellipse_height)
+      ellipse_right = QGraphicsEllipseItem(-mini_ellipse_width / 2, -mini_ellipse_height / 2, mini_ellipse_width, mini_ellipse_height)
+      ellipse_left.setPos(x, y)
+      ellipse_right.setPos(-x, y)
       ellipse_left.setPen(pg.mkPen(color='w'))
       ellipse_right.setPen(pg.mkPen(color='w'))
       self.pressure_points['left'][idx] = ellipse_left
@@ -92,7 +151,31 @@ class ForceRawDataPage(DataPageInterface):
     layout.addWidget(self.left_foot_plot, 1, 0, 2, 2)
     layout.addWidget(self.right_foot_plot, 1, 2, 2, 2)
 
+    self.heatmap_checkbox = QCheckBox('Heatmap')
+    self.heatmap_checkbox.setChecked(self.heatmap)
+    self.heatmap_checkbox.toggled.connect(self.setHeatmap)
+    layout.addWidget(self.heatmap_checkbox, 3, 0, 1, 4)
+
     self.initializeLines()
+    self.initializePalette()
+
+  # brushes and label text for every pressure level, built once so updates only index into them
+  def initializePalette(self):
+    cmap = pg.ColorMap([0.0, 1.0], [pg.mkColor(255,255,255), pg.mkColor(255,0,0)])
+    self.brush_palette = []
+    self.label_palette = []
+    for level in range(pressure_levels):
+      weight = level / (pressure_levels - 1)
+      gradient = QRadialGradient(0, 0, mini_ellipse_width)
+      gradient.setColorAt(0, cmap.mapToQColor(weight))
+      gradient.setColorAt(1, QColor(255,255,255))
+      self.brush_palette.append(QBrush(gradient))
+      self.label_palette.append(f'{weight:.2f}')
+    # [left|right] -> level currently shown at each node, -1 until first drawn
+    self.shown_levels = {
+      'left': np.full(len(left_foot_pressure_points), -1),
+      'right': np.full(len(left_foot_pressure_points), -1)
+    }
 
   def createLabel(self, x: float, y: float):
     label = QGraphicsSimpleTextItem('0')
@@ -112,86 +195,54 @@ class ForceRawDataPage(DataPageInterface):
     right_foot.setPen(pg.mkPen(width=2, color='r'))
     self.right_foot_plot.addItem(right_foot)
 
+    # heatmap images sit under the insole outline, the right foot reuses the left foot's weights mirrored
+    self.heatmap_engine = InsoleHeatmap()
+    lut = InsoleHeatmap.lookupTable()
+    self.heatmap_images: Dict[str, pg.ImageItem] = {}
+    for side, plot in (('left', self.left_foot_plot), ('right', self.right_foot_plot)):
+      image = pg.ImageItem()
+      image.setLookupTable(lut)
+      image.setLevels([0, 255])
+      image.setZValue(-1)
+      self.heatmap_images[side] = image
+      plot.addItem(image)
+    self.setHeatmap(self.heatmap)
+
+  def setHeatmap(self, heatmap: bool):
+    self.heatmap = heatmap
+    for side, image in self.heatmap_images.items():
+      image.setVisible(heatmap)
+      for ellipse in self.pressure_points[side].values():
+        ellipse.setVisible(not heatmap)
+    # the ellipse brushes aren't updated under the heatmap, only their labels, so they catch up with the labels here
+    if not heatmap and hasattr(self, 'shown_levels'):
+      for side, levels in self.shown_levels.items():
+        for node in np.flatnonzero(levels >= 0):
+          self.pressure_points[side][node].setBrush(self.brush_palette[levels[node]])
+
   # ignoring imu data
   def updateData(self, data: ImuData):
-    cmap = pg.ColorMap([0.0, 1.0], [pg.mkColor(255,255,255), pg.mkColor(255,0,0)])
-    random_pressures = [random.random() for _ in range(8)]
+    random_pressures = np.random.random(len(left_foot_pressure_points))
+    levels = np.rint(random_pressures * (pressure_levels - 1)).astype(int)
     for side, ellipses in self.pressure_points.items():
-      for node, ellipse in ellipses.items():
-        x, y = left_foot_pressure_points[node]
-        weight = random_pressures[node]
-        gradient = QRadialGradient(x if side=='left' else -x, y, mini_ellipse_width)
-        gradient.setColorAt(0, cmap.mapToQColor(weight))
-        gradient.setColorAt(1, QColor(255,255,255))
-        ellipse.setBrush(QBrush(gradient))
-        self.labels[side][node].setText(f'{weight:.2f}')
-
-
-
-
-
-# horrible attempt at interpolated heatmap
-
-    # normalized_pressures = [pressure/max(random_pressures) for pressure in random_pressures]
-    # x_min, x_max = left_foot_pressure_points[:, 0].min(), left_foot_pressure_points[:,0].max()
-    # y_min, y_max = left_foot_pressure_points[:, 1].min(), left_foot_pressure_points[:,1].max()
-    # grid_x, grid_y = np.mgrid[-30:30:50j, -100:100:50j]
-    # # grid_x, grid_y = np.mgrid[-28.2:31:50j, -96.8:96.5:50j]
-    # # grid_x, grid_y = np.mgrid[-20:20:50j, -80:80:50j]
-    # grid_z = griddata(left_foot_pressure_points, random_pressures, (grid_x, grid_y), method='cubic')
-    # grid_z = np.nan_to_num(grid_z, nan=0.0)
-    # mask = ((grid_x**2/(ellipse_width/4)**2) + (grid_y**2)/((ellipse_height/2)**2)) <= 1
-    # grid_z[~mask]=0
-    # # grid_x, grid_y = np.meshgrid(x, y)
-    # # interpolated = griddata(left_foot_pressure_points, random_pressures, (grid_x, grid_y), method='cubic')
-    # # heatmap = pg.ImageItem(interpolated)
-    # # heatmap.setOpts(interpolation='linear')
-    # # heatmap.setLookupTable(pg.colormap.get('viridis').getLookupTable())
-    # heatmap = pg.ImageItem()
-    # heatmap.setImage(grid_z)
-    # heatmap.setRect(pg.QtCore.QRectF(-ellipse_width/2 + 5.9, -ellipse_height/2, ellipse_width, ellipse_height))
-    # heatmap.setZValue(-1)
-    # # heatmap.setLookupTable(pg.colormap.get('viridis').getLookupTable())
-    # cmap = pg.ColorMap([0.0, 1.0], [pg.mkColor(255,255,255), pg.mkColor(255,160,160)])
-    # heatmap.setLookupTable(cmap.getLookupTable())
-    # self.left_foot_plot.addItem(heatmap)
-    # heatmap.setImage(interpolated)
-    # heatmap.setColorMap(pg.colormap.get('viridis'))
-    # heatmap = np.zeros((grid_size, grid_size))
-    # for (point, pressure) in zip(left_foot_pressure_points, random_pressures):
-    #   x, y = point
-    #   heatmap[int(-y+250), int(x+250)] = pressure
-
-    # mask = np.zeros((grid_size, grid_size))
-    # map_center = (grid_size // 2, grid_size // 2)
-    # for x in range(grid_size):
-    #   for y in range(grid_size):
-    #     dx = x - map_center[0]
-    #     dy = y - map_center[1]
-    #     if (dx ** 2)/((ellipse_width/2)**2) + (dy ** 2)/((ellipse_height/2)**2) <= 1:
-    #       mask[y, x] = 1
-
-    # masked_heatmap = heatmap * mask
-    # # print(masked_heatmap)
-
-    # cmap = pg.ColorMap([0, 0.2, 0.4, 0.6, 0.8, 1], 
-    #                [(0, 0, 255), (0, 255, 255), (0, 255, 0), (255, 255, 0), (255, 0, 0), (255, 0, 0)])
-    # heatmap_image = pg.ImageItem(masked_heatmap)
-    # heatmap_image.setColorMap
-    # # heatmap_image.setLookupTable(cmap.getLookupTable(255))
-    # self.left_foot_plot.addItem(heatmap_image)
-
-    # masked_heatmap = masked_heatmap / np.max(masked_heatmap)
-      # x, y = point
-      # grid_x = int((x + 50) % grid_size)
-      # grid_y = int((y + 100) % grid_size)
-      # heatmap[grid_y, grid_x] = pressure
-        # colors = cmap.map(normalized)
-    # scatter = pg.ScatterPlotItem(left_foot_pressure_points_x, left_foot_pressure_points_y, brush=colors)
-    # self.left_foot_plot.addItem(scatter)
-
-
-
-
-
-    
+      if self.heatmap:
+        with instrumentation.span('ForceRawDataPage.heatmap'):
+          image = self.heatmap_engine.render(random_pressures, mirror=side == 'right')
+          self.heatmap_images[side].setImage(image, autoLevels=False, rect=self.heatmap_engine.rect)
+      # only nodes whose quantized pressure changed are touched, the labels stay on top of the heatmap
+      for node in np.flatnonzero(levels != self.shown_levels[side]):
+        level = levels[node]
+        if not self.heatmap:
+          ellipses[node].setBrush(self.brush_palette[level])
+        self.labels[side][node].setText(self.label_palette[level])
+      self.shown_levels[side] = levels
+
+  # only the newest pressures are shown
+  def updateBatch(self, samples):
+    if len(samples):
+      self.updateData(samples[-1])
+
+  def refresh(self):
+    store = self.data_source.store
+    if len(store):
+      self.updateData(store.imuDataAt(-1))
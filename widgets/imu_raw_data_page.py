@@ -1,16 +1,24 @@
-from PyQt6.QtWidgets import QGridLayout, QLabel, QTableWidget, QVBoxLayout, QHBoxLayout, QHeaderView, QTableWidgetItem
+from PyQt6.QtWidgets import QGridLayout, QLabel, QTableView, QVBoxLayout, QHBoxLayout
 from PyQt6.QtCore import Qt
 from sensor_data_collector import SensorDataCollector
 from widgets import DataPageInterface
+from widgets.sample_table_model import SampleTableModel, create_sample_table
+from widgets.plot_ranges import visible_sample_range
 from data_view_publisher import DataViewPublisher
 from data_structures import *
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+import numpy as np
 import pyqtgraph as pg
+import instrumentation
 
 XYZ_AXES = ['x', 'y', 'z']
 WXYZ_AXES = ['w', 'x', 'y', 'z']
 EULER_AXES = ['roll', 'pitch', 'yaw']
 
+# number of most recent samples shown when scrolling, None plots the whole history
+# either way the lines are drawn as a min/max envelope of about 2 points per pixel, see MinMaxPyramid
+DEFAULT_WINDOW_SIZE = 1000
+
 plot_config = {
   'accel': XYZ_AXES,
   'gyro': XYZ_AXES,
@@ -18,6 +26,14 @@ plot_config = {
   'euler': EULER_AXES
 }
 
+# store channel prefix of each plot, e.g. plot_channel_config['quat'] + '.w' -> 'positionData.quatOrientation.w'
+plot_channel_config = {
+  'accel': 'accelData',
+  'gyro': 'gyroData',
+  'quat': 'positionData.quatOrientation',
+  'euler': 'positionData.eulerOrientation'
+}
+
 axis_color_config = {
   'x': pg.mkPen(color='r', width=3),
   'y': pg.mkPen(color='g', width=3),
@@ -29,13 +45,14 @@ axis_color_config = {
 }
 
 class ImuRawDataPage(DataPageInterface):
-  def __init__(self, data_source: DataViewPublisher, label: str, visible: bool = False):
+  def __init__(self, data_source: DataViewPublisher, label: str, visible: bool = False, window: Optional[int] = DEFAULT_WINDOW_SIZE):
     super().__init__()
     self.label = label
+    self.window = window
     self.sensor_data_collector = SensorDataCollector()
     self.data_source = data_source
     self.data_source.subscribe(self)
-    self.data: List[ImuData] = []
+    self.store = data_source.store
     self.visible = visible
     self.setup()
 
@@ -63,25 +80,29 @@ class ImuRawDataPage(DataPageInterface):
     self.accel_plot_left.getPlotItem().setTitle('Accel Plot', color='k', size='14')
     self.accel_table_left = create_formatted_table(
             rowHeaders=XYZ_AXES,
-            colHeader='accel')
+            colHeader='accel',
+            channel=plot_channel_config['accel'])
     self.gyro_plot_left = pg.PlotWidget()
     self.gyro_plot_left.setBackground('white')
     self.gyro_plot_left.getPlotItem().setTitle('Gyro Plot', color='k', size='14')
     self.gyro_table_left = create_formatted_table(
             rowHeaders=XYZ_AXES,
-            colHeader='gyro')
+            colHeader='gyro',
+            channel=plot_channel_config['gyro'])
     self.quat_plot_left = pg.PlotWidget()
     self.quat_plot_left.setBackground('white')
     self.quat_plot_left.getPlotItem().setTitle('Quat Plot', color='k', size='14')
     self.quat_table_left = create_formatted_table(
             rowHeaders=WXYZ_AXES,
-            colHeader='quat orient')
+            colHeader='quat orient',
+            channel=plot_channel_config['quat'])
     self.euler_plot_left = pg.PlotWidget()
     self.euler_plot_left.setBackground('white')
     self.euler_plot_left.getPlotItem().setTitle('Euler Plot', color='k', size='14')
     self.euler_table_left = create_formatted_table(
             rowHeaders=EULER_AXES,
-            colHeader='euler orient')
+            colHeader='euler orient',
+            channel=plot_channel_config['euler'])
     left_data_layout.setRowStretch(0, 2)
     left_data_layout.setRowStretch(1, 2)
     left_data_layout.setRowStretch(2, 1)
@@ -100,25 +121,29 @@ class ImuRawDataPage(DataPageInterface):
     self.accel_plot_right.getPlotItem().setTitle('Accel Plot', color='k', size='14')
     self.accel_table_right = create_formatted_table(
             rowHeaders=XYZ_AXES,
-            colHeader='accel')
+            colHeader='accel',
+            channel=plot_channel_config['accel'])
     self.gyro_plot_right = pg.PlotWidget()
     self.gyro_plot_right.setBackground('white')
     self.gyro_plot_right.getPlotItem().setTitle('Gyro Plot', color='k', size='14')
     self.gyro_table_right = create_formatted_table(
             rowHeaders=XYZ_AXES,
-            colHeader='gyro')
+            colHeader='gyro',
+            channel=plot_channel_config['gyro'])
     self.quat_plot_right = pg.PlotWidget()
     self.quat_plot_right.setBackground('white')
     self.quat_plot_right.getPlotItem().setTitle('Quat Plot', color='k', size='14')
     self.quat_table_right = create_formatted_table(
             rowHeaders=WXYZ_AXES,
-            colHeader='quat orient')
+            colHeader='quat orient',
+            channel=plot_channel_config['quat'])
     self.euler_plot_right = pg.PlotWidget()
     self.euler_plot_right.setBackground('white')
     self.euler_plot_right.getPlotItem().setTitle('Euler Plot', color='k', size='14')
     self.euler_table_right = create_formatted_table(
             rowHeaders=EULER_AXES,
-            colHeader='euler orient')
+            colHeader='euler orient',
+            channel=plot_channel_config['euler'])
     right_data_layout.setRowStretch(0, 2)
     right_data_layout.setRowStretch(1, 2)
     right_data_layout.setRowStretch(2, 1)
@@ -140,8 +165,8 @@ class ImuRawDataPage(DataPageInterface):
     self.initializeLines()
 
     # dictionary of map table names to table
-    # self.table_mape[left|right][accel|gyro|quat|euler] -> returns QTableWidget
-    self.table_map: Dict[str, Dict[str, QTableWidget]] = {
+    # self.table_mape[left|right][accel|gyro|quat|euler] -> returns QTableView
+    self.table_map: Dict[str, Dict[str, QTableView]] = {
       'left': {
         'accel': self.accel_table_left,
         'gyro': self.gyro_table_left,
@@ -159,14 +184,14 @@ class ImuRawDataPage(DataPageInterface):
   def initializeLines(self):
 
     # sample usage:
-    # self.plot_data[accel|gyro][left|right][x|y|z] -> returns list (initially empty), containing data points
-    # self.plot_data[quat][left|right][w|x|y|z]
-    # self.plot_data[euler][left|right][roll|pitch|yaw]
-    self.plot_data: Dict[str, Dict[str, Dict[str, List[float]]]] = {}
+    # self.plot_channels[accel|gyro][left|right][x|y|z] -> returns name of the store channel holding the data points
+    # self.plot_channels[quat][left|right][w|x|y|z]
+    # self.plot_channels[euler][left|right][roll|pitch|yaw]
+    self.plot_channels: Dict[str, Dict[str, Dict[str, str]]] = {}
     for plot_name, axes in plot_config.items():
-      self.plot_data[plot_name] = {
-        'left': initialize_plot_data(axes),
-        'right': initialize_plot_data(axes)
+      self.plot_channels[plot_name] = {
+        'left': initialize_plot_channels(plot_name, axes),
+        'right': initialize_plot_channels(plot_name, axes)
       }
     
     # self.plot_items[accel|gyro|quat|euler][left|right] -> returns PlotItem, where lines will be plotted
@@ -195,6 +220,13 @@ class ImuRawDataPage(DataPageInterface):
     # self.plot_lines[euler][left|right][roll|pitch|yaw]
     self.plot_lines: Dict[str, Dict[str, Dict[str, pg.PlotDataItem]]] = {}
 
+    # store count at the last redraw, lines are only touched when new samples have arrived
+    self.drawn_count = 0
+    # the envelope only covers what's in view once zoomed or panned, so moving the view needs a redraw
+    for plots in self.plot_items.values():
+      for plot_item in plots.values():
+        plot_item.getViewBox().sigRangeChangedManually.connect(self.redrawLines)
+
     for plot_name, axes in plot_config.items():
       # get the left and right plot items (to add lines to)
       plot_left_item = self.plot_items[plot_name]['left']
@@ -205,7 +237,7 @@ class ImuRawDataPage(DataPageInterface):
         'left': {
           # for each axis (w,x,y,z,roll,pitch,yaw) in this particular plot, get the data
           axis: plot_left_item.plot(
-            y=self.plot_data[plot_name]['left'][axis],
+            y=self.store.view(self.plot_channels[plot_name]['left'][axis]),
             name=axis,
             pen=axis_color_config[axis],
             width=5,
@@ -213,7 +245,7 @@ class ImuRawDataPage(DataPageInterface):
         },
         'right': {
           axis: plot_right_item.plot(
-            y=self.plot_data[plot_name]['right'][axis],
+            y=self.store.view(self.plot_channels[plot_name]['right'][axis]),
             name=axis,
             pen=axis_color_config[axis],
             width=5,
@@ -222,48 +254,55 @@ class ImuRawDataPage(DataPageInterface):
       }
 
   # *** update the data to render ***
+  # the publisher has already written the sample to the shared store
   def updateData(self, data: ImuData):
-    plot_values = {
-      'accel': data.accelData,
-      'gyro': data.gyroData,
-      'quat': data.positionData.quatOrientation,
-      'euler': data.positionData.eulerOrientation
-    }
-    self.data.append(data)
-    for plot_name, new_data in plot_values.items():
-      for axis in plot_config[plot_name]:
-        value = getattr(new_data, axis)
-        self.plot_data[plot_name]['left'][axis].append(value)
-        self.plot_data[plot_name]['right'][axis].append(value)
-
     if self.visible:
-      self.updateLines()
-      self.updateTables(plot_values)
+      with instrumentation.span('ImuRawDataPage.setData'):
+        self.updateLines()
+      with instrumentation.span('ImuRawDataPage.updateTables'):
+        self.updateTables(data)
+
+  # lines are drawn from the store, so a batch costs the same single redraw as one sample
+  def updateBatch(self, samples):
+    if self.visible and len(samples):
+      self.updateData(samples[-1])
+
+  # the store kept the history while the page was hidden, so only the latest sample needs fetching
+  def refresh(self):
+    if len(self.store):
+      self.updateData(self.store.imuDataAt(-1))
 
   def updateLines(self):
+    count = self.store.count
+    if count == self.drawn_count:
+      return
+    self.drawn_count = count
+    # a scrolling window follows the newest samples, the envelope keeps the points per line at about
+    # 2 per pixel however wide the window or history is, and x is the absolute sample index either way
+    first = 0 if self.window is None else count - self.window
     for plot_name, plots in self.plot_lines.items():
       for side, axes in plots.items():
+        start, end, points = visible_sample_range(self.plot_items[plot_name][side], first)
         for axis, line in axes.items():
-          line.setData(y=self.plot_data[plot_name][side][axis])
+          x, y = self.store.envelope(self.plot_channels[plot_name][side][axis], start, end, points)
+          line.setData(x=x, y=y, skipFiniteCheck=True)
+
+  def redrawLines(self, *args):
+    self.drawn_count = -1
+    self.updateLines()
 
-  def updateTables(self, table_data):
-    for side, tables in self.table_map.items():
-      for table_name, table in tables.items():
-        data = table_data[table_name]
-        for i, axis in enumerate(data):
-          table.setItem(i, 0, QTableWidgetItem(f'{axis:.5f}'))
+  # the models only keep the sample, the views format the cells they show when they next paint
+  def updateTables(self, data: ImuData):
+    for tables in self.table_map.values():
+      for table in tables.values():
+        table.model().setSample(data)
 
 # helpers
-def create_formatted_table(rowHeaders: List[str], colHeader: str):
-    table = QTableWidget()
-    table.setRowCount(len(rowHeaders))
-    table.setColumnCount(1)
-    table.setHorizontalHeaderLabels([colHeader])
-    table.setVerticalHeaderLabels(rowHeaders)
-    table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-    table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-    return table
+# one column table of the latest sample's channel.<row header> fields
+def create_formatted_table(rowHeaders: List[str], colHeader: str, channel: str):
+    model = SampleTableModel([[f'{channel}.{row}'] for row in rowHeaders], rowHeaders, [colHeader])
+    return create_sample_table(model)
 
-# returns { axis name : list of data points }
-def initialize_plot_data(axes: List[str]):
-  return {axis: [] for axis in axes}
\ No newline at end of file
+# returns { axis name : store channel name }
+def initialize_plot_channels(plot_name: str, axes: List[str]):
+  return {axis: f'{plot_channel_config[plot_name]}.{axis}' for axis in axes}
\ No newline at end of file
@@ -1,40 +1,227 @@
 from abc import abstractmethod
+from collections import OrderedDict
 import math
 from PyQt6.QtOpenGLWidgets import QOpenGLWidget
 from OpenGL.GL import *
-from typing import Tuple
+from OpenGL.error import GLError, NullFunctionError
+from typing import Callable, Dict, List, Optional, Tuple
 import random
 
 import numpy as np
+import instrumentation
+
+# draws a leg outline from a vertex buffer object, vertices are only uploaded again after setVertices
+# falls back to client-side vertex arrays when buffer objects aren't available
+# only needs a current GL context, so it can run on an offscreen context (e.g. Mesa llvmpipe) as well as in a widget
+class LegMeshRenderer:
+    def __init__(self, color: Tuple[float, float, float] = (1.0, 0.0, 0.0)):
+        self.color = color
+        self.vertices = np.zeros((0, 2), dtype=np.float32)
+        self.vbo = None
+        self.dirty = True
+
+    # call with the GL context current
+    def initialize(self):
+        try:
+            self.vbo = glGenBuffers(1)
+        except (GLError, NullFunctionError):
+            self.vbo = None
+        self.dirty = True
+
+    # (N, 2) points, drawn as GL_LINES between consecutive pairs
+    def setVertices(self, points):
+        self.vertices = np.ascontiguousarray(points, dtype=np.float32).reshape(-1, 2)
+        self.dirty = True
+
+    # draws vertices [first, first + count), all of them by default
+    def draw(self, first: int = 0, count: Optional[int] = None):
+        count = len(self.vertices) - first if count is None else count
+        if count <= 0:
+            return
+        glColor3f(*self.color)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        if self.vbo is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            if self.dirty:
+                glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_DYNAMIC_DRAW)
+                self.dirty = False
+            glVertexPointer(2, GL_FLOAT, 0, None)
+        else:
+            glVertexPointer(2, GL_FLOAT, 0, self.vertices)
+        glDrawArrays(GL_LINES, first, count)
+        if self.vbo is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    # call with the GL context the buffer was made in current
+    def cleanup(self):
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
 
 class LegDisplay(QOpenGLWidget,):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.renderer = LegMeshRenderer()
+        self.points = [[random.random()%1,0.5],[-0.5, -0.5], [0.5, -0.5]]
+        self.renderer.setVertices(self.points)
+        self.line_thickness = 3.0
+
     def initializeGL(self):
         glEnable(GL_DEPTH_TEST)
         glClearColor(0.0, 0.0, 0.0, 1.0)
-
-        self.points = [[random.random()%1,0.5],[-0.5, -0.5], [0.5, -0.5]]
-
-        self.line_thickness = 3.0
+        self.renderer.initialize()
+        # a widget gets a new context when it's reparented, the buffer has to go with the old one
+        # there's no QOpenGLContext when initializeGL is called on a context made outside Qt, e.g. the benchmark's
+        if self.context() is not None:
+            self.context().aboutToBeDestroyed.connect(self.cleanupGL)
+
+    # whoever made a context outside Qt releases the renderer themselves, with that context current
+    def cleanupGL(self):
+        if self.context() is None:
+            return
+        self.makeCurrent()
+        self.renderer.cleanup()
+        self.doneCurrent()
     
     def updatePoints(self, new_points):
         self.points = new_points
+        self.renderer.setVertices(new_points)
 
     def paintGL(self):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLineWidth(self.line_thickness)
-        glBegin(GL_LINES)
-        
-        for point in self.points:
-            glColor3f(1.0, 0.0, 0.0)
-            glVertex3f(point[0], point[1], 0.0)
-
-        glEnd()
+        self.renderer.draw()
 
     def resizeGL(self, w, h):
         glViewport(0, 0, w, h)
 
+# draws several leg views side by side on one GL surface in a single paint pass
+# every view's vertices share one buffer, each view is drawn into its own viewport of a rows x cols grid
+class MultiLegDisplay(QOpenGLWidget):
+    def __init__(self, rows: int, cols: int, parent=None, spacing: int = 10,
+                 background: Tuple[float, float, float] = (0.827, 0.827, 0.827)):
+        super().__init__(parent)
+        self.rows = rows
+        self.cols = cols
+        # gap between views and the colour shown in it
+        self.spacing = spacing
+        self.background = background
+        self.renderer = LegMeshRenderer()
+        self.views: List[np.ndarray] = [np.zeros((0, 2), dtype=np.float32) for _ in range(rows * cols)]
+        self.offsets: List[int] = [0] * (rows * cols)
+        self.views_changed = True
+        self.line_thickness = 3.0
+
+    # views are numbered left to right, top to bottom
+    def updateView(self, index: int, points):
+        self.views[index] = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        self.views_changed = True
+
+    def initializeGL(self):
+        glEnable(GL_DEPTH_TEST)
+        self.renderer.initialize()
+        if self.context() is not None:
+            self.context().aboutToBeDestroyed.connect(self.cleanupGL)
+
+    def cleanupGL(self):
+        if self.context() is None:
+            return
+        self.makeCurrent()
+        self.renderer.cleanup()
+        self.doneCurrent()
+
+    # GL calls are queued, so this times submitting the frame rather than the GPU drawing it
+    def paintGL(self):
+        with instrumentation.span('MultiLegDisplay.paintGL', 'gl'):
+            self.drawViews()
+
+    def drawViews(self):
+        if self.views_changed:
+            self.offsets = np.cumsum([0] + [len(view) for view in self.views[:-1]]).tolist()
+            self.renderer.setVertices(np.concatenate(self.views))
+            self.views_changed = False
+
+        ratio = self.devicePixelRatio()
+        width, height = int(self.width() * ratio), int(self.height() * ratio)
+        spacing = int(self.spacing * ratio)
+        cell_width = (width - spacing * (self.cols - 1)) // self.cols
+        cell_height = (height - spacing * (self.rows - 1)) // self.rows
+
+        glClearColor(*self.background, 1.0)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glLineWidth(self.line_thickness)
+        glEnable(GL_SCISSOR_TEST)
+        glClearColor(0.0, 0.0, 0.0, 1.0)
+        for index, view in enumerate(self.views):
+            row, col = divmod(index, self.cols)
+            # GL puts the origin at the bottom left
+            x = col * (cell_width + spacing)
+            y = height - (row + 1) * cell_height - row * spacing
+            glViewport(x, y, cell_width, cell_height)
+            glScissor(x, y, cell_width, cell_height)
+            glClear(GL_COLOR_BUFFER_BIT)
+            self.renderer.draw(self.offsets[index], len(view))
+        glDisable(GL_SCISSOR_TEST)
+
+# distance between generated points along each edge of the leg outline
+default_step_size = 0.0001
+
+# meshes for recently seen poses, keyed by pose rounded to angle_resolution degrees and com_resolution
+# the least recently used mesh is evicted once max_entries is reached
+class PoseMeshCache:
+    def __init__(self, max_entries: int = 512, angle_resolution: float = 1.0, com_resolution: float = 0.05):
+        self.max_entries = max_entries
+        self.angle_resolution = angle_resolution
+        self.com_resolution = com_resolution
+        self.meshes: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def quantizePose(self, knee_deg: float, ankle_deg: float, foot_com: float) -> Tuple[float, float, float]:
+        return (
+            round(knee_deg / self.angle_resolution) * self.angle_resolution,
+            round(ankle_deg / self.angle_resolution) * self.angle_resolution,
+            round(foot_com / self.com_resolution) * self.com_resolution
+        )
+
+    # cached meshes are read-only since every caller gets the same array
+    def get(self, key, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        mesh = self.meshes.get(key)
+        if mesh is not None:
+            self.hits += 1
+            self.meshes.move_to_end(key)
+            return mesh
+        self.misses += 1
+        mesh = compute()
+        mesh.setflags(write=False)
+        self.meshes[key] = mesh
+        if len(self.meshes) > self.max_entries:
+            self.meshes.popitem(last=False)
+        return mesh
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.meshes),
+            'bytes': sum(mesh.nbytes for mesh in self.meshes.values())
+        }
+
+    def clear(self):
+        self.meshes.clear()
+        self.hits = 0
+        self.misses = 0
+
 class LegFunctions:
-    def __init__(self):
+    # with a cache, getPoints snaps the pose to the cache's resolution and reuses meshes for poses it has seen
+    def __init__(self, step_size: float = default_step_size, cache: Optional[PoseMeshCache] = None):
+        self.cache = cache
+        # which leg the view is of, only matters where the mesh is mirrored
+        self.side = None
+
         # these do not change
         # starts (closer to head)
         
@@ -49,7 +236,7 @@ class LegFunctions:
         self.knee_width = 0.1
         self.shank_width = 0.11
         self.ankle_width = 0.075
-        self.step_size = 0.0001
+        self.step_size = step_size
 
         # these do change
 
@@ -73,96 +260,97 @@ class LegFunctions:
         self.ankle_deg = ankle_deg
         self.foot_com = foot_com
 
+    # returns points on both sides of a vertical line from smaller_y to larger_y, with widths going from
+    # smaller_width to larger_width, as an (N, 2) float32 array
     def getVerticalPoints(self, smaller_y, larger_y, smaller_width, larger_width):
-        points = []
-
-        if smaller_y > larger_y:
-            case1 = True
-        else:
-            case1 = False
-        
         rangie = math.ceil(abs((smaller_y-larger_y)/self.step_size))
-        width = np.arange(smaller_width, larger_width, (larger_width-smaller_width)/rangie).tolist()
-        start = smaller_y
-        end = larger_y
-
-        i = start
-        while(i >= end and case1 == True) or (i <= end and case1 == False):
-            location = int(abs((i - start)/(self.step_size)))
-            points += [[-width[location], i]]
-            if case1:
-                i -= self.step_size
-            else:
-                i += self.step_size
-
-        if(len(points)%2 == 1):
-            points = points[:-1]
-        
-        i = start
-        while(i >= end and case1 == True) or (i <= end and case1 == False):
-            location = int(abs((i - start)/(self.step_size)))
-            points += [[width[location], i]]
-            if case1:
-                i -= self.step_size
-            else:
-                i += self.step_size
-        
-        if(len(points)%2 == 1):
-            points = points[:-1]
-
+        direction = -1 if smaller_y > larger_y else 1
+        # one point per step from smaller_y up to and including larger_y
+        steps = np.arange(int(abs(smaller_y-larger_y)/self.step_size + 1e-9) + 1)
+        # lines are plotted by consecutive points, so each side needs an even number of points
+        steps = steps[:len(steps) - len(steps) % 2]
+        y = smaller_y + direction*steps*self.step_size
+        width = smaller_width + steps*(larger_width-smaller_width)/rangie
+
+        points = np.empty((2*len(steps), 2), dtype=np.float32)
+        points[:len(steps), 0] = -width
+        points[len(steps):, 0] = width
+        points[:len(steps), 1] = y
+        points[len(steps):, 1] = y
         return points
 
     # returns points on both sides of a line denoted by start (x1, y1) and end (x2, y2), with corresponding widths at each point
     def getDiagPoints(self, start: Tuple[float, float], end: Tuple[float, float], start_width: float, end_width: float, weight: float):
-        points = []
         x1, y1 = start
         x2, y2 = end
         # y2 == y1 causes issue because line_func is x in terms of y, not one-to-one
-        # start_width = end_width causes issue because increments = 0, can't be used with np.arange(., ., step)
         if y2 == y1:
             y2 += 0.0001
         if x2 == x1:
             x2 += 0.0001
 
         rangie = abs((y1-y2)/self.step_size)
-
         delta_width = (end_width - start_width)/rangie
-        width = np.arange(start_width, end_width + 2*delta_width, delta_width).tolist()
 
-        # line defined by start/end points, function returns x in terms of y
-        line_func = lambda y : (y-y1)*(x2-x1)/(y2-y1) + x1
         slope = (y2-y1)/(x2-x1)
         perpendicular_slope = -1/slope
         # determining which direction to go in
         step = self.step_size if y1 <= y2 else -self.step_size
-        idx = 0
-        for y in np.arange(y1, y2 + step, step):
-            dx = width[idx]*weight/math.sqrt(1+perpendicular_slope**2)
-            dy = dx*perpendicular_slope
-            points += [[line_func(y) + dx, y + dy]]
-            points += [[line_func(y) - dx, y - dy]]
-            idx += 1
-        # picking every other, rearranging array since lines plotted by consecutive points
-        first_half = points[::2]
-        second_half = points[1::2]
-        if len(first_half) % 2 == 1: first_half = first_half[:-1]
-        if len(second_half) % 2 == 1: second_half = second_half[:-1]
-        points = first_half + second_half
+        y = np.arange(y1, y2 + step, step)
+        # line defined by start/end points, x in terms of y
+        x = (y-y1)*(x2-x1)/(y2-y1) + x1
+        width = start_width + np.arange(len(y))*delta_width
+        dx = width*weight/math.sqrt(1+perpendicular_slope**2)
+        dy = dx*perpendicular_slope
+
+        # one side of the line then the other, each with an even number of points since lines are plotted by consecutive points
+        count = len(y) - len(y) % 2
+        points = np.empty((2*count, 2), dtype=np.float32)
+        points[:count, 0] = (x + dx)[:count]
+        points[:count, 1] = (y + dy)[:count]
+        points[count:, 0] = (x - dx)[:count]
+        points[count:, 1] = (y - dy)[:count]
         return points
 
-    @abstractmethod
+    # returns (N, 2) float32 array of all points to draw
     def getPoints(self):
-        # returns array of all points to draw
+        if self.cache is None:
+            return self.computePoints()
+        pose = self.cache.quantizePose(self.knee_deg, self.ankle_deg, self.foot_com)
+        key = (type(self).__name__, self.side, self.step_size) + pose
+        return self.cache.get(key, lambda: self.computePointsAt(*pose))
+
+    def computePointsAt(self, knee_deg, ankle_deg, foot_com):
+        current_pose = self.knee_deg, self.ankle_deg, self.foot_com
+        self.knee_deg, self.ankle_deg, self.foot_com = knee_deg, ankle_deg, foot_com
+        try:
+            return self.computePoints()
+        finally:
+            self.knee_deg, self.ankle_deg, self.foot_com = current_pose
+
+    # fills the cache with every knee angle the weights table covers (0-89 degrees of flexion)
+    def precomputeKneeRange(self, ankle_deg: float = 90, foot_com: float = 0):
+        if self.cache is None:
+            return
+        current_pose = self.knee_deg, self.ankle_deg, self.foot_com
+        for knee_deg in np.arange(0, 90, self.cache.angle_resolution):
+            self.knee_deg, self.ankle_deg, self.foot_com = knee_deg, ankle_deg, foot_com
+            self.getPoints()
+        self.knee_deg, self.ankle_deg, self.foot_com = current_pose
+
+    @abstractmethod
+    def computePoints(self):
+        # returns (N, 2) float32 array of all points to draw for the current pose
         pass
 
 class SideLegFunctions(LegFunctions):
-    def __init__(self, side):
-        super().__init__()
+    def __init__(self, side, step_size: float = default_step_size, cache: Optional[PoseMeshCache] = None):
+        super().__init__(step_size, cache)
         self.side = side
         self.foot_bottom = [0.1515, (self.foot_top[1] - 0.0455)]
         self.weights = np.linspace(1.2, 0.8, 90)
 
-    def getPoints(self):
+    def computePoints(self):
         current_thigh_end = [0, self.thigh_end[1]]
         current_shank_end = self.shank_end
         if(self.foot_com < 0):
@@ -175,14 +363,15 @@ class SideLegFunctions(LegFunctions):
             current_foot_left[0] *= -1
             current_foot_right[0] *= -1
 
+        # segments of the outline, joined into one array at the end
         points = []
 
-        points += self.getVerticalPoints(current_thigh_end[1], (current_thigh_end[1]-current_shank_end[1])/2+current_shank_end[1], self.knee_width, self.shank_width)
-        points += self.getVerticalPoints(current_shank_end[1], (current_thigh_end[1]-current_shank_end[1])/2+current_shank_end[1], self.ankle_width, self.shank_width)
+        points.append(self.getVerticalPoints(current_thigh_end[1], (current_thigh_end[1]-current_shank_end[1])/2+current_shank_end[1], self.knee_width, self.shank_width))
+        points.append(self.getVerticalPoints(current_shank_end[1], (current_thigh_end[1]-current_shank_end[1])/2+current_shank_end[1], self.ankle_width, self.shank_width))
         if (self.side =='right'):
-            points += [[-self.ankle_width, current_shank_end[1]], current_foot_right, current_foot_right, current_foot_left, [self.ankle_width, current_shank_end[1]], current_foot_left]
+            points.append(np.array([[-self.ankle_width, current_shank_end[1]], current_foot_right, current_foot_right, current_foot_left, [self.ankle_width, current_shank_end[1]], current_foot_left], dtype=np.float32))
         else:
-            points += [[self.ankle_width, current_shank_end[1]], current_foot_right, current_foot_right, current_foot_left, [-self.ankle_width, current_shank_end[1]], current_foot_left]
+            points.append(np.array([[self.ankle_width, current_shank_end[1]], current_foot_right, current_foot_right, current_foot_left, [-self.ankle_width, current_shank_end[1]], current_foot_left], dtype=np.float32))
             
         sign = -1 if self.side == 'right' else 1
         weight = self.weights[min(int(self.knee_deg), 89)]
@@ -205,28 +394,28 @@ class SideLegFunctions(LegFunctions):
                 adjusted_thigh_end[0] - sign*dx,
                 adjusted_thigh_end[1] - sign*dx*perp_slope
             ]
-            points += [knee_start, knee_end]
+            points.append(np.array([knee_start, knee_end], dtype=np.float32))
         elif (adjusted_thigh_end[1] == current_thigh_start[1]):
             knee_start = [current_thigh_end[0]-sign*self.knee_width, current_thigh_end[1]]
             knee_end = [
                 current_thigh_end[0]+sign*self.knee_width,
                 current_thigh_end[1]+2*self.knee_width*weight
             ]
-            points += [knee_start, knee_end]
+            points.append(np.array([knee_start, knee_end], dtype=np.float32))
 
         # add points from middle of thigh to knee
-        points += self.getDiagPoints(knee_hip_midpoint, adjusted_thigh_end, self.thigh_width, self.knee_width, weight)
+        points.append(self.getDiagPoints(knee_hip_midpoint, adjusted_thigh_end, self.thigh_width, self.knee_width, weight))
         # add points from hip to middle of thigh
-        points += self.getDiagPoints(knee_hip_midpoint, current_thigh_start, self.thigh_width, self.hip_width, weight)
+        points.append(self.getDiagPoints(knee_hip_midpoint, current_thigh_start, self.thigh_width, self.hip_width, weight))
         # points += [current_thigh_start, adjusted_thigh_end]
-        return points
+        return np.concatenate(points)
 
 class FrontLegFunctions(LegFunctions):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, step_size: float = default_step_size, cache: Optional[PoseMeshCache] = None):
+        super().__init__(step_size, cache)
         self.foot_bottom = [0.0455, (self.foot_top[1] - 0.0455)]
 
-    def getPoints(self):
+    def computePoints(self):
         current_thigh_end = [0, self.thigh_end[1]]
         current_thigh_start = [0, (self.thigh_start[1]*self.knee_deg/90)]
         current_shank_end = self.shank_end
@@ -237,15 +426,16 @@ class FrontLegFunctions(LegFunctions):
             current_foot_left = [-self.foot_bottom[0]*2, self.foot_bottom[1]-(self.foot_bottom[1]-self.foot_top[1])*self.foot_com]
             current_foot_right = [self.foot_bottom[0]*2, self.foot_bottom[1]]
 
+        # segments of the outline, joined into one array at the end
         points = []
         if not self.knee_deg < 1:
-            points += self.getVerticalPoints(current_thigh_start[1], (current_thigh_start[1]-current_thigh_end[1])/2+current_thigh_end[1], self.hip_width, self.thigh_width)
-            points += self.getVerticalPoints(current_thigh_end[1], (current_thigh_start[1]-current_thigh_end[1])/2+current_thigh_end[1], self.knee_width, self.thigh_width)
+            points.append(self.getVerticalPoints(current_thigh_start[1], (current_thigh_start[1]-current_thigh_end[1])/2+current_thigh_end[1], self.hip_width, self.thigh_width))
+            points.append(self.getVerticalPoints(current_thigh_end[1], (current_thigh_start[1]-current_thigh_end[1])/2+current_thigh_end[1], self.knee_width, self.thigh_width))
         
-        points += self.getVerticalPoints(current_thigh_end[1], (current_thigh_end[1]-current_shank_end[1])/2+current_shank_end[1], self.knee_width, self.shank_width)
-        points += self.getVerticalPoints(current_shank_end[1], (current_thigh_end[1]-current_shank_end[1])/2+current_shank_end[1], self.ankle_width, self.shank_width)
+        points.append(self.getVerticalPoints(current_thigh_end[1], (current_thigh_end[1]-current_shank_end[1])/2+current_shank_end[1], self.knee_width, self.shank_width))
+        points.append(self.getVerticalPoints(current_shank_end[1], (current_thigh_end[1]-current_shank_end[1])/2+current_shank_end[1], self.ankle_width, self.shank_width))
 
-        points += [[self.ankle_width, current_shank_end[1]], current_foot_right, current_foot_right, current_foot_left, [-self.ankle_width, current_shank_end[1]], current_foot_left]
+        points.append(np.array([[self.ankle_width, current_shank_end[1]], current_foot_right, current_foot_right, current_foot_left, [-self.ankle_width, current_shank_end[1]], current_foot_left], dtype=np.float32))
 
             
-        return points
\ No newline at end of file
+        return np.concatenate(points)
\ No newline at end of file
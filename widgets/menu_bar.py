@@ -1,4 +1,4 @@
-from PyQt6.QtWidgets import QWidget, QHBoxLayout, QWidget, QPushButton
+from PyQt6.QtWidgets import QWidget, QHBoxLayout, QWidget, QPushButton, QLabel
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFont
 
@@ -17,6 +17,8 @@ class MenuBar(QWidget):
         self.kneeImuDataButton = QPushButton("Knee IMU")
         self.kneeAngleDataButton = QPushButton("Knee Angle")
         self.feetDataButton = QPushButton("Feet Pressure")
+        self.rawDataButton = QPushButton("Raw Data")
+        self.timingButton = QPushButton("Timing")
 
         menuButtons = [
             self.homeButton,
@@ -24,7 +26,9 @@ class MenuBar(QWidget):
             self.ankleImuDataButton,
             self.kneeImuDataButton,
             self.kneeAngleDataButton,
-            self.feetDataButton
+            self.feetDataButton,
+            self.rawDataButton,
+            self.timingButton
         ]
 
         for button in menuButtons:
@@ -34,3 +38,13 @@ class MenuBar(QWidget):
             
         self.setLayout(layout)
 
+# shows how far rendering is behind acquisition, subscribed to the publisher like a page
+class RenderStatsLabel(QLabel):
+    def __init__(self, dataSource):
+        super().__init__()
+        self.dataSource = dataSource
+        self.dataSource.subscribe(self)
+        self.setFont(QFont("Times", 12))
+
+    def updateBatch(self, samples):
+        self.setText(f"lag: {self.dataSource.lagSamples} | dropped: {self.dataSource.droppedFrames}")
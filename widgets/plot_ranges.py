@@ -0,0 +1,13 @@
+from typing import Tuple
+import numpy as np
+import pyqtgraph as pg
+
+# samples [start, end) a plot shows and its width in pixels, for asking the store for an envelope of them
+# while the plot follows its data that's every sample from `start` on, once zoomed or panned it's only what's in view
+def visible_sample_range(plot_item: pg.PlotItem, start: float = 0) -> Tuple[float, float, int]:
+  view_box = plot_item.getViewBox()
+  points = max(int(view_box.width()), 100)
+  if view_box.autoRangeEnabled()[0]:
+    return start, np.inf, points
+  x_min, x_max = view_box.viewRange()[0]
+  return np.floor(x_min), np.ceil(x_max) + 1, points
@@ -1,25 +1,55 @@
-from sensor_data_collector import SensorDataCollector
+from sensor_data_collector import SensorDataCollector, ImuLogReader
 from data_view_publisher import DataViewPublisher
 from widgets import DataPageInterface
+from widgets.sample_table_model import SampleTableModel, create_sample_table
+from widgets.sample_history import SampleHistoryBrowser
 from style_sheets import *
-from PyQt6.QtWidgets import QGridLayout, QTextEdit, QTableWidget, QVBoxLayout, QHBoxLayout, QHeaderView, QSlider, QTableWidgetItem
+from PyQt6.QtWidgets import QCheckBox, QGridLayout, QVBoxLayout, QHBoxLayout, QSlider
 from PyQt6.QtCore import Qt
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as Canvas
 from matplotlib.figure import Figure
 from matplotlib.axes import Axes
 from matplotlib.lines import Line2D
 from data_structures import *
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+import instrumentation
+
+# lines drawn on each axes: [(store channel, color)], the legend uses the last part of the channel name
+axes_line_config = {
+    'accelData': [('accelData.x', 'r'), ('accelData.y', 'b'), ('accelData.z', 'g')],
+    'linearAccelData': [('linearAccelData.x', 'r'), ('linearAccelData.y', 'b'), ('linearAccelData.z', 'g')],
+    'gravityAccel': [('gravityAccel.x', 'r'), ('gravityAccel.y', 'b'), ('gravityAccel.z', 'g')],
+    'gyroData': [('gyroData.x', 'r'), ('gyroData.y', 'b'), ('gyroData.z', 'g')],
+    'magData': [('magData.x', 'r'), ('magData.y', 'b'), ('magData.z', 'g')],
+    'position': [('positionData.position.x', 'r'), ('positionData.position.y', 'b'), ('positionData.position.z', 'g')],
+    'quatOrientation': [
+        ('positionData.quatOrientation.w', 'k'),
+        ('positionData.quatOrientation.x', 'r'),
+        ('positionData.quatOrientation.y', 'g'),
+        ('positionData.quatOrientation.z', 'b')
+    ],
+    'eulerOrientation': [
+        ('positionData.eulerOrientation.roll', 'r'),
+        ('positionData.eulerOrientation.pitch', 'g'),
+        ('positionData.eulerOrientation.yaw', 'b')
+    ]
+}
 
 class RawDataPage(DataPageInterface):
-    def __init__(self, data_source: DataViewPublisher, visible: bool):
+    # passing a log_reader opens the page on a recorded log, the slider then scrubs the log instead of live data
+    def __init__(self, data_source: DataViewPublisher, visible: bool, log_reader: Optional[ImuLogReader] = None):
         super().__init__()
         self.sensor_data_collector = SensorDataCollector()
         self.data_source = data_source
         self.data_source.subscribe(self)
-        self.data: List[ImuData] = []
+        self.store = data_source.store
+        self.log_reader = log_reader
         self.visible = visible
         self.setup()
+        if self.log_reader is not None and len(self.log_reader):
+            self.slider.setRange(0, len(self.log_reader) - 1)
+            self.update_tables(0)
     
     def setup(self):
         layout = QGridLayout()
@@ -31,16 +61,18 @@ class RawDataPage(DataPageInterface):
         self.setup_graphs()
         self.setup_table()
 
-        self.rawData2 = QTextEdit()
-        self.rawData2.setText("Placeholder text")
-        self.rawData2.setReadOnly(True)
-        self.rawData2.setStyleSheet(PLACEHOLDER_STYLE_SHEET)
-        
+        # every sample in the log or in memory, clicking one shows it in the tables above
+        self.history = SampleHistoryBrowser()
+        self.history.sampleSelected.connect(self.selectSample)
+        if self.log_reader is not None:
+            self.history.model.setLog(self.log_reader)
+        else:
+            self.history.model.setStore(self.store)
         
         layout.addWidget(self.canvas1, 0, 1)
         layout.addWidget(self.canvas2, 1, 1)
         layout.addLayout(self.tables_imu, 0, 0)
-        layout.addWidget(self.rawData2, 1, 0)
+        layout.addWidget(self.history, 1, 0)
 
         # ==== end of example ====
         self.setLayout(layout)
@@ -74,27 +106,53 @@ class RawDataPage(DataPageInterface):
         }
 
         format_axes(self.axes_to_name_mapping)
+
+        # persistent lines, updated in place and blitted over a cached background of each axes
+        # self.axes_lines[axes] -> [(store channel, Line2D)]
+        self.axes_lines: Dict[Axes, List[Tuple[str, Line2D]]] = {}
+        for ax, name in self.axes_to_name_mapping.items():
+            lines = []
+            for channel, color in axes_line_config[name]:
+                line, = ax.plot([], [], color=color, animated=True)
+                lines.append((channel, line))
+            ax.legend([line for _, line in lines], [channel.split('.')[-1] for channel, _ in axes_line_config[name]], fontsize=5, loc='upper right')
+            self.axes_lines[ax] = lines
+        self.canvas_axes: Dict[Canvas, List[Axes]] = {
+            self.canvas1: self.fig1.axes,
+            self.canvas2: self.fig2.axes
+        }
+        self.backgrounds = {}
+        # store count when the graphs were last updated, only samples after it are checked against the limits
+        self.drawn_count = 0
+        self.x_values = np.arange(self.store.capacity, dtype=np.float64)
+        for canvas in self.canvas_axes:
+            canvas.mpl_connect('draw_event', lambda _, canvas=canvas: self.on_draw(canvas))
         
     def setup_table(self):
         layout = QVBoxLayout()
         
+        axis3d_rows = ['accelData', 'linearAccelData', 'gravityAccel', 'gyroData', 'magData']
         self.axis3d_table = create_formatted_table(
-            rowHeaders=['accelData', 'linearAccelData', 'gravityAccel', 'gyroData', 'magData'],
-            colHeaders=['x', 'y', 'z'])
+            rowHeaders=axis3d_rows,
+            colHeaders=['x', 'y', 'z'],
+            cells=[[f'{row}.{axis}' for axis in ['x', 'y', 'z']] for row in axis3d_rows])
 
         self.position_table = create_formatted_table(
             rowHeaders=['x', 'y', 'z'],
-            colHeaders=['position']
+            colHeaders=['position'],
+            cells=[[f'positionData.position.{axis}'] for axis in ['x', 'y', 'z']]
         )
 
         self.quat_table = create_formatted_table(
             rowHeaders=['w', 'x', 'y', 'z'],
-            colHeaders=['quat orientation']
+            colHeaders=['quat orientation'],
+            cells=[[f'positionData.quatOrientation.{axis}'] for axis in ['w', 'x', 'y', 'z']]
         )
 
         self.euler_table = create_formatted_table(
             rowHeaders=['roll', 'pitch', 'yaw'],
-            colHeaders=['euler orientation']
+            colHeaders=['euler orientation'],
+            cells=[[f'positionData.eulerOrientation.{axis}'] for axis in ['roll', 'pitch', 'yaw']]
         )
 
         position_tables_layout = QHBoxLayout()
@@ -105,100 +163,100 @@ class RawDataPage(DataPageInterface):
         self.slider = QSlider(Qt.Orientation.Horizontal)
         self.slider.setRange(0,0)
         self.slider.valueChanged.connect(self.update_tables)
+        self.slider.sliderMoved.connect(lambda value: self.follow_box.setChecked(value == self.slider.maximum()))
+        # while checked the tables show the newest sample, picking a sample with the slider or the history unchecks it
+        self.follow_box = QCheckBox('Follow latest')
+        self.follow_box.setChecked(True)
+        self.follow_box.setVisible(self.log_reader is None)
+        self.follow_box.toggled.connect(lambda checked: checked and self.refresh())
+        slider_layout = QHBoxLayout()
+        slider_layout.addWidget(self.slider)
+        slider_layout.addWidget(self.follow_box)
     
         layout.addWidget(self.axis3d_table)
         layout.addLayout(position_tables_layout)
-        layout.addWidget(self.slider)
+        layout.addLayout(slider_layout)
         self.tables_imu = layout
 
+    # shows a sample picked in the history, live updates no longer move the tables off it
+    def selectSample(self, value: int):
+        self.follow_box.setChecked(False)
+        self.slider.setValue(value)
+
     def update_tables(self, value):
-        imu_data = self.data[value]
-        self.populate_axis3d_row(0, imu_data.accelData)
-        self.populate_axis3d_row(1, imu_data.linearAccelData)
-        self.populate_axis3d_row(2, imu_data.gravityAccel)
-        self.populate_axis3d_row(3, imu_data.gyroData)
-        self.populate_axis3d_row(4, imu_data.magData)
-        self.populate_position(imu_data.positionData)
-
-    def populate_axis3d_row(self, row: int, data: Axis3d):
-        self.axis3d_table.setItem(row, 0, QTableWidgetItem(f'{data.x:.5f}'))
-        self.axis3d_table.setItem(row, 1, QTableWidgetItem(f'{data.y:.5f}'))
-        self.axis3d_table.setItem(row, 2, QTableWidgetItem(f'{data.z:.5f}'))
-
-    def populate_position(self, data: PositionData):
-        self.position_table.setItem(0, 0, QTableWidgetItem(f'{data.position.x:.5f}'))
-        self.position_table.setItem(0, 1, QTableWidgetItem(f'{data.position.y:.5f}'))
-        self.position_table.setItem(0, 2, QTableWidgetItem(f'{data.position.z:.5f}'))
-        self.quat_table.setItem(0, 0, QTableWidgetItem(f'{data.quatOrientation.w:.5f}'))
-        self.quat_table.setItem(0, 1, QTableWidgetItem(f'{data.quatOrientation.x:.5f}'))
-        self.quat_table.setItem(0, 2, QTableWidgetItem(f'{data.quatOrientation.y:.5f}'))
-        self.quat_table.setItem(0, 3, QTableWidgetItem(f'{data.quatOrientation.z:.5f}'))
-        self.euler_table.setItem(0, 0, QTableWidgetItem(f'{data.eulerOrientation.roll:.5f}'))
-        self.euler_table.setItem(0, 1, QTableWidgetItem(f'{data.eulerOrientation.pitch:.5f}'))
-        self.euler_table.setItem(0, 2, QTableWidgetItem(f'{data.eulerOrientation.yaw:.5f}'))
+        # records are read straight out of the mapped log, so jumping anywhere costs the same
+        imu_data = self.log_reader[value] if self.log_reader is not None else self.store.imuDataAt(value)
+        for table in [self.axis3d_table, self.position_table, self.quat_table, self.euler_table]:
+            table.model().setSample(imu_data)
         
     def updateData(self, data: ImuData):
-        self.data.append(data)
-        self.slider.setRange(0, len(self.data) - 1)
-        self.slider.setValue(len(self.data) - 1)
-        self.update_tables(len(self.data) - 1)
-        self.update_graphs()
+        if self.log_reader is not None:
+            return
+        self.slider.setRange(0, len(self.store) - 1)
+        if self.follow_box.isChecked():
+            self.slider.setValue(len(self.store) - 1)
+            with instrumentation.span('RawDataPage.update_tables'):
+                self.update_tables(len(self.store) - 1)
+        with instrumentation.span('RawDataPage.update_graphs'):
+            self.update_graphs()
+        self.history.model.requestSync()
+
+    def refresh(self):
+        if self.log_reader is None and len(self.store):
+            self.updateData(self.store.imuDataAt(-1))
 
     def update_graphs(self):
-        if self.visible: 
-            for ax in self.fig1.axes + self.fig2.axes:
-                name = self.axes_to_name_mapping[ax]
-                ax.cla()
-                if (name not in ['quatOrientation', 'eulerOrientation']):
-                    data_to_plot = [getattr(imudata, name) if name != 'position' else imudata.positionData.position for imudata in self.data]
-                    # data_to_plot = [getattr(imudata, name) for imudata in self.data if name ]
-                    x = [data.x for data in data_to_plot]
-                    y = [data.y for data in data_to_plot]
-                    z = [data.z for data in data_to_plot]
-                    ln1 = ax.plot(x, color='r')
-                    ln2 = ax.plot(y, color='b')
-                    ln3 = ax.plot(z, color='g')
-                    ax.set_title(name, fontsize=5)
-                    ax.legend(['x', 'y', 'z'], fontsize=5, loc='upper right')
-                elif (name == 'quatOrientation'):
-                    data_to_plot = [imudata.positionData.quatOrientation for imudata in self.data]
-                    w = [data.w for data in data_to_plot]
-                    x = [data.x for data in data_to_plot]
-                    y = [data.y for data in data_to_plot]
-                    z = [data.z for data in data_to_plot]
-                    ax.plot(w, color='k')
-                    ax.plot(x, color='r')
-                    ax.plot(y, color='g')
-                    ax.plot(z, color='b')
-                    ax.legend(['w', 'x', 'y', 'z'], fontsize=5, loc='upper right')
-                elif (name == 'eulerOrientation'):
-                    data_to_plot = [imudata.positionData.eulerOrientation for imudata in self.data]
-                    roll = [data.roll for data in data_to_plot]
-                    pitch = [data.pitch for data in data_to_plot]
-                    yaw = [data.yaw for data in data_to_plot]
-                    ax.plot(roll, color='r')
-                    ax.plot(pitch, color='g')
-                    ax.plot(yaw, color='b')
-                    ax.legend(['roll', 'pitch', 'yaw'], fontsize=5, loc='upper right')
-                    # ax.draw_artist(ln1)
-                    # ax.draw_artist(ln2)
-                    # ax.draw_artist(ln3)
-            # self.fig1.canvas.blit(self.fig1.bbox)
-            # self.fig1.canvas.flush_events()
-            self.canvas1.draw()
-            self.canvas2.draw()
-            
-            
-
-def create_formatted_table(rowHeaders: List[str], colHeaders: List[str]):
-    table = QTableWidget()
-    table.setRowCount(len(rowHeaders))
-    table.setColumnCount(len(colHeaders))
-    table.setHorizontalHeaderLabels(colHeaders)
-    table.setVerticalHeaderLabels(rowHeaders)
-    table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-    table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-    return table
+        if not self.visible or len(self.store) == 0:
+            return
+        size = len(self.store)
+        new_samples = min(self.store.count - self.drawn_count, size)
+        self.drawn_count = self.store.count
+        x = self.x_values[:size]
+        for canvas, axes in self.canvas_axes.items():
+            rescale = any(ax not in self.backgrounds for ax in axes)
+            for ax in axes:
+                for channel, line in self.axes_lines[ax]:
+                    y = self.store.view(channel)
+                    line.set_data(x, y)
+                    rescale |= self.exceeds_limits(ax, y[size - new_samples:], size)
+            # a full redraw is only needed when new data falls outside the current limits,
+            # the draw_event handler then grabs fresh backgrounds and draws the lines on top
+            if rescale:
+                for ax in axes:
+                    self.rescale(ax, size)
+                canvas.draw()
+                continue
+            for ax in axes:
+                canvas.restore_region(self.backgrounds[ax])
+                for _, line in self.axes_lines[ax]:
+                    ax.draw_artist(line)
+                canvas.blit(ax.bbox)
+
+    # true when the newest values or sample count don't fit in the axes limits
+    def exceeds_limits(self, ax: Axes, new_values, size: int) -> bool:
+        if len(new_values) == 0:
+            return False
+        y_min, y_max = ax.get_ylim()
+        return size > ax.get_xlim()[1] or new_values.min() < y_min or new_values.max() > y_max
+
+    def rescale(self, ax: Axes, size: int):
+        # leave room to grow so the limits aren't exceeded again on the next sample
+        ax.set_xlim(0, max(2 * size, 100))
+        y_min = min(self.store.view(channel).min() for channel, _ in self.axes_lines[ax])
+        y_max = max(self.store.view(channel).max() for channel, _ in self.axes_lines[ax])
+        margin = max(0.1 * (y_max - y_min), 0.05)
+        ax.set_ylim(y_min - margin, y_max + margin)
+
+    # called after every full draw of a canvas
+    def on_draw(self, canvas: Canvas):
+        for ax in self.canvas_axes[canvas]:
+            self.backgrounds[ax] = canvas.copy_from_bbox(ax.bbox)
+            for _, line in self.axes_lines[ax]:
+                ax.draw_artist(line)
+
+# cells[row][column] is the attribute path of the sample shown in that cell
+def create_formatted_table(rowHeaders: List[str], colHeaders: List[str], cells: List[List[str]]):
+    return create_sample_table(SampleTableModel(cells, rowHeaders, colHeaders))
 
 def format_axes(axes: Dict[Axes, str]):
     for axis, name in axes.items():
@@ -0,0 +1,346 @@
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QComboBox, QDoubleSpinBox, QHBoxLayout, QHeaderView, QLabel, QLineEdit, QPushButton, QTableView, QVBoxLayout, QWidget
+from data_store import SampleStore, channel_field, imu_channels
+from sensor_data_collector import ImuLogReader, imu_sample_rate
+import instrumentation
+
+# the most times a second a live history picks up new samples
+default_sync_rate = 10
+
+time_column = 'time'
+
+# every sample of a log or the live store as a table, one row per sample and one column per channel
+# nothing is copied out of the source: rows are read straight from the store's ring buffers or the mapped log
+# when the view paints them, so only the visible cells cost anything however long the history is
+# sorting and threshold filters keep an array of the source rows in display order, the only memory that grows with the history
+class SampleHistoryModel(QAbstractTableModel):
+    def __init__(self, channels: List[str] = imu_channels, sample_rate: float = imu_sample_rate, precision: int = 5,
+                 sync_rate: float = default_sync_rate, parent=None):
+        super().__init__(parent)
+        self.channels = channels
+        self.headers = [f'{time_column} (s)'] + channels
+        self.sample_rate = sample_rate
+        self.float_format = f'{{:.{precision}f}}'.format
+        self.time_format = '{:.2f}'.format
+        self.column_source: Optional[Callable[[str], np.ndarray]] = None
+        self.columns: List[np.ndarray] = []
+        self.formats: List[Callable] = []
+        self.live_store: Optional[SampleStore] = None
+        # number of the first source row, the live store drops its oldest samples once it is full
+        self.first_sample = 0
+        # the store's views are only valid until its next write and frames write more often than the model syncs,
+        # so the columns are read again when the store has moved on; source row r is then at r + column_offset
+        self.read_count = 0
+        self.column_offset = 0
+        self.source_rows = 0
+        self.rows = 0
+        # source row of every displayed row, None while the rows are shown in order and unfiltered
+        self.order: Optional[np.ndarray] = None
+        # channel -> (minimum, maximum), either may be None for no bound
+        self.thresholds: Dict[str, Tuple[Optional[float], Optional[float]]] = {}
+        self.sort_column = 0
+        self.sort_order = Qt.SortOrder.AscendingOrder
+        self.min_interval = 1 / sync_rate
+        self.last_sync = 0.0
+        self.sync_timer = QTimer(self)
+        self.sync_timer.setSingleShot(True)
+        self.sync_timer.timeout.connect(self.sync)
+
+    # browses a recorded log, columns are strided views of the mapped records
+    def setLog(self, reader: ImuLogReader):
+        self.live_store = None
+        self.sample_rate = reader.sample_rate
+        self.setSource(lambda channel: channel_field(reader.records, channel), len(reader), 0)
+
+    # browses the live store, sync() picks up new samples
+    def setStore(self, store: SampleStore):
+        self.live_store = store
+        self.setSource(store.view, len(store), store.count - len(store))
+
+    def setSource(self, column_source: Callable[[str], np.ndarray], rows: int, first_sample: int):
+        self.beginResetModel()
+        self.column_source = column_source
+        self.readColumns(rows, first_sample)
+        self.order = self.sortedRows()
+        self.rows = self.source_rows if self.order is None else len(self.order)
+        self.endResetModel()
+
+    def readColumns(self, rows: int, first_sample: int):
+        self.columns = [self.column_source(channel) for channel in self.channels]
+        self.formats = [self.float_format if column.dtype.kind == 'f' else str for column in self.columns]
+        self.source_rows = rows
+        self.first_sample = first_sample
+        self.column_offset = 0
+        if self.live_store is not None:
+            self.read_count = self.live_store.count
+
+    # rereads the live store's views without changing the rows, before a cell is read after a write
+    def refreshColumns(self):
+        store = self.live_store
+        if store is None or store.count == self.read_count:
+            return
+        self.columns = [store.view(channel) for channel in self.channels]
+        self.column_offset = self.first_sample - (store.count - len(store))
+        self.read_count = store.count
+
+    # index of a displayed row's sample in the log or the live store as it is now, -1 if it has left memory since the last sync
+    def sampleIndex(self, row: int) -> int:
+        self.refreshColumns()
+        index = self.sourceRow(row) + self.column_offset
+        return index if index >= 0 else -1
+
+    # rate limited like SampleTableModel, the newest samples always show up once the interval is up
+    def requestSync(self):
+        elapsed = time.perf_counter() - self.last_sync
+        if elapsed >= self.min_interval:
+            self.sync()
+        elif not self.sync_timer.isActive():
+            self.sync_timer.start(int((self.min_interval - elapsed) * 1000) + 1)
+
+    # rereads the live store, rows are shifted in place rather than reset so the view keeps its scroll position
+    def sync(self):
+        self.last_sync = time.perf_counter()
+        self.sync_timer.stop()
+        if self.live_store is None:
+            return
+        with instrumentation.span('SampleHistoryModel.sync'):
+            store = self.live_store
+            first_sample, source_rows = self.first_sample, self.source_rows
+            self.readColumns(len(store), store.count - len(store))
+            self.order = self.mergedRows(first_sample, source_rows)
+            self.setRowTotal(self.source_rows if self.order is None else len(self.order))
+            if self.rows:
+                last = self.index(self.rows - 1, len(self.headers) - 1)
+                self.dataChanged.emit(self.index(0, 0), last, [Qt.ItemDataRole.DisplayRole])
+                self.headerDataChanged.emit(Qt.Orientation.Vertical, 0, self.rows - 1)
+
+    def setRowTotal(self, rows: int):
+        if rows > self.rows:
+            self.beginInsertRows(QModelIndex(), self.rows, rows - 1)
+            self.rows = rows
+            self.endInsertRows()
+        elif rows < self.rows:
+            self.beginRemoveRows(QModelIndex(), rows, self.rows - 1)
+            self.rows = rows
+            self.endRemoveRows()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    # source row shown at a displayed row
+    def sourceRow(self, row: int) -> int:
+        return row if self.order is None else int(self.order[row])
+
+    # false for rows a live sync is about to remove
+    def hasRow(self, row: int) -> bool:
+        return row < (self.source_rows if self.order is None else len(self.order))
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid() or not self.hasRow(index.row()):
+            return None
+        source_row = self.sourceRow(index.row())
+        column = index.column()
+        if column == 0:
+            return self.time_format((self.first_sample + source_row) / self.sample_rate)
+        self.refreshColumns()
+        if source_row + self.column_offset < 0:
+            return None
+        return self.formats[column - 1](self.columns[column - 1][source_row + self.column_offset])
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        if not self.hasRow(section):
+            return None
+        return str(self.first_sample + self.sourceRow(section))
+
+    # values of a column for every source row, the time column is the only one built on demand
+    def columnValues(self, column: int) -> np.ndarray:
+        if column == 0:
+            return (self.first_sample + np.arange(self.source_rows)) / self.sample_rate
+        return self.columns[column - 1]
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.reorder()
+
+    # keeps only samples with minimum <= channel <= maximum, None leaves that side open
+    def setThreshold(self, channel: str, minimum: Optional[float], maximum: Optional[float]):
+        if minimum is None and maximum is None:
+            self.thresholds.pop(channel, None)
+        else:
+            self.thresholds[channel] = (minimum, maximum)
+        self.reorder()
+
+    def clearThresholds(self):
+        self.thresholds.clear()
+        self.reorder()
+
+    # sorting and filtering are user actions, resetting is simpler than mapping every persistent index
+    def reorder(self):
+        self.beginResetModel()
+        self.order = self.sortedRows()
+        self.rows = self.source_rows if self.order is None else len(self.order)
+        self.endResetModel()
+
+    # source rows in display order for the current thresholds and sort, None when that is every row in order
+    def sortedRows(self) -> Optional[np.ndarray]:
+        rows = self.source_rows
+        order = None
+        if self.thresholds:
+            mask = np.ones(rows, dtype=bool)
+            for channel, (minimum, maximum) in self.thresholds.items():
+                values = self.columnValues(self.headers.index(channel) if channel in self.channels else 0)
+                if minimum is not None:
+                    mask &= values[:rows] >= minimum
+                if maximum is not None:
+                    mask &= values[:rows] <= maximum
+            order = np.flatnonzero(mask)
+        descending = self.sort_order == Qt.SortOrder.DescendingOrder
+        if self.sort_column == 0:
+            if descending:
+                order = (np.arange(rows) if order is None else order)[::-1]
+            return order
+        values = self.columnValues(self.sort_column)
+        if order is None:
+            order = np.argsort(values[:rows], kind='stable')
+        else:
+            order = order[np.argsort(values[order], kind='stable')]
+        return order[::-1] if descending else order
+
+    # sortedRows() after a live sync, from the order before it: rows that left memory are dropped and only the
+    # new rows are filtered, sorted and merged in, which gives the same order as sorting everything again
+    # first_sample and source_rows are from before the sync
+    def mergedRows(self, first_sample: int, source_rows: int) -> Optional[np.ndarray]:
+        shift = self.first_sample - first_sample
+        new_start = source_rows - shift
+        if self.order is None or new_start < 0:
+            return self.sortedRows()
+        order = self.order - shift
+        if shift:
+            order = order[order >= 0]
+        new = np.arange(new_start, self.source_rows)
+        for channel, (minimum, maximum) in self.thresholds.items():
+            values = self.valuesAt(self.headers.index(channel) if channel in self.channels else 0, new)
+            if minimum is not None:
+                new = new[values >= minimum]
+                values = values[values >= minimum]
+            if maximum is not None:
+                new = new[values <= maximum]
+        descending = self.sort_order == Qt.SortOrder.DescendingOrder
+        if self.sort_column == 0:
+            return np.concatenate([new[::-1], order]) if descending else np.concatenate([order, new])
+        # merged in ascending order, new rows go after equal old ones as they would in a stable sort
+        ascending = order[::-1] if descending else order
+        values = self.columnValues(self.sort_column)
+        new = new[np.argsort(values[new], kind='stable')]
+        ascending = np.insert(ascending, np.searchsorted(values[ascending], values[new], side='right'), new)
+        return ascending[::-1] if descending else ascending
+
+    # values of a column at some source rows
+    def valuesAt(self, column: int, rows: np.ndarray) -> np.ndarray:
+        if column == 0:
+            return (self.first_sample + rows) / self.sample_rate
+        return self.columns[column - 1][rows]
+
+    # displayed row of the sample closest to a time in seconds, -1 if no sample is shown
+    def rowAtTime(self, seconds: float) -> int:
+        if self.rows == 0:
+            return -1
+        target = int(round(seconds * self.sample_rate)) - self.first_sample
+        target = min(max(target, 0), self.source_rows - 1)
+        if self.order is None:
+            return target
+        if self.sort_column == 0:
+            # still in time order, just filtered or reversed
+            ascending = self.order if self.sort_order == Qt.SortOrder.AscendingOrder else self.order[::-1]
+            position = min(int(np.searchsorted(ascending, target)), len(ascending) - 1)
+            if position > 0 and target - ascending[position - 1] < ascending[position] - target:
+                position -= 1
+            return position if self.sort_order == Qt.SortOrder.AscendingOrder else len(ascending) - 1 - position
+        return int(np.abs(self.order - target).argmin())
+
+
+# table of a SampleHistoryModel with threshold filter and jump-to-time controls
+class SampleHistoryBrowser(QWidget):
+    # index of the sample clicked in the log or in memory as it is at the click, 0 is the oldest sample
+    sampleSelected = pyqtSignal(int)
+
+    def __init__(self, model: Optional[SampleHistoryModel] = None, parent=None):
+        super().__init__(parent)
+        self.model = model or SampleHistoryModel(parent=self)
+        self.setup()
+
+    def setup(self):
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+
+        self.channel_box = QComboBox()
+        self.channel_box.addItems([time_column] + self.model.channels)
+        self.minimum_edit = QLineEdit()
+        self.minimum_edit.setPlaceholderText('min')
+        self.maximum_edit = QLineEdit()
+        self.maximum_edit.setPlaceholderText('max')
+        filter_button = QPushButton('Filter')
+        filter_button.clicked.connect(lambda _: self.applyThreshold())
+        clear_button = QPushButton('Clear')
+        clear_button.clicked.connect(lambda _: self.clearThresholds())
+        self.time_box = QDoubleSpinBox()
+        self.time_box.setRange(0, 1e9)
+        self.time_box.setSuffix(' s')
+        jump_button = QPushButton('Go to')
+        jump_button.clicked.connect(lambda _: self.jumpToTime(self.time_box.value()))
+        for widget in [self.channel_box, self.minimum_edit, self.maximum_edit, filter_button, clear_button,
+                       QLabel('time'), self.time_box, jump_button]:
+            controls.addWidget(widget)
+
+        # fixed row heights keep scrolling independent of the number of rows, the header never measures them
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(self.table.fontMetrics().height() + 6)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.table.horizontalHeader().setDefaultSectionSize(90)
+        self.table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.table.horizontalHeader().setSortIndicator(0, Qt.SortOrder.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.clicked.connect(lambda index: self.selectRow(index.row()))
+
+        layout.addLayout(controls)
+        layout.addWidget(self.table)
+
+    def selectRow(self, row: int):
+        index = self.model.sampleIndex(row)
+        if index >= 0:
+            self.sampleSelected.emit(index)
+
+    def applyThreshold(self):
+        try:
+            minimum = float(self.minimum_edit.text()) if self.minimum_edit.text().strip() else None
+            maximum = float(self.maximum_edit.text()) if self.maximum_edit.text().strip() else None
+        except ValueError:
+            return
+        self.model.setThreshold(self.channel_box.currentText(), minimum, maximum)
+
+    def clearThresholds(self):
+        self.minimum_edit.clear()
+        self.maximum_edit.clear()
+        self.model.clearThresholds()
+
+    def jumpToTime(self, seconds: float):
+        row = self.model.rowAtTime(seconds)
+        if row < 0:
+            return
+        index = self.model.index(row, 0)
+        self.table.scrollTo(index, QTableView.ScrollHint.PositionAtCenter)
+        self.table.selectRow(row)
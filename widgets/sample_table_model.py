@@ -0,0 +1,68 @@
+import time
+from operator import attrgetter
+from typing import List, Optional
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer
+from PyQt6.QtWidgets import QHeaderView, QTableView
+
+# the most times a second the views are told the sample changed, matches the publisher's frame rate
+default_refresh_rate = 30
+
+# table of the fields of one sample, each cell is an attribute path into it such as 'accelData.x'
+# setSample only keeps a reference to the sample, a cell is formatted when its view paints it, so hidden
+# and scrolled-off cells cost nothing; views get a single dataChanged for the whole table, at most refresh_rate
+# times a second, and the last sample set is always shown once the interval is up
+class SampleTableModel(QAbstractTableModel):
+    def __init__(self, cells: List[List[str]], row_headers: List[str], column_headers: List[str],
+                 refresh_rate: float = default_refresh_rate, precision: int = 5, parent=None):
+        super().__init__(parent)
+        self.getters = [[attrgetter(cell) for cell in row] for row in cells]
+        self.row_headers = row_headers
+        self.column_headers = column_headers
+        self.format = f'{{:.{precision}f}}'.format
+        self.sample = None
+        self.min_interval = 1 / refresh_rate
+        self.last_refresh = 0.0
+        # fires once the interval is up when a sample arrived too soon after the last refresh
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.getters)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.column_headers)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or self.sample is None or not index.isValid():
+            return None
+        return self.format(self.getters[index.row()][index.column()](self.sample))
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        headers = self.column_headers if orientation == Qt.Orientation.Horizontal else self.row_headers
+        return headers[section]
+
+    def setSample(self, sample):
+        self.sample = sample
+        elapsed = time.perf_counter() - self.last_refresh
+        if elapsed >= self.min_interval:
+            self.refresh()
+        elif not self.refresh_timer.isActive():
+            self.refresh_timer.start(int((self.min_interval - elapsed) * 1000) + 1)
+
+    def refresh(self):
+        self.last_refresh = time.perf_counter()
+        self.refresh_timer.stop()
+        last = self.index(self.rowCount() - 1, self.columnCount() - 1)
+        self.dataChanged.emit(self.index(0, 0), last, [Qt.ItemDataRole.DisplayRole])
+
+# read-only view of a SampleTableModel with every row and column stretched to fit, like the pages' old tables
+def create_sample_table(model: SampleTableModel, parent=None) -> QTableView:
+    table = QTableView(parent)
+    table.setModel(model)
+    table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+    table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+    table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+    return table
@@ -0,0 +1,73 @@
+import time
+from PyQt6.QtWidgets import QCheckBox, QFileDialog, QHBoxLayout, QHeaderView, QPushButton, QTableWidget, QTableWidgetItem, QVBoxLayout
+from PyQt6.QtCore import Qt
+from widgets import DataPageInterface
+from data_view_publisher import DataViewPublisher
+import instrumentation
+
+# how often the table is rebuilt while the page is shown
+default_refresh_interval = 0.25
+
+timing_columns = ['calls', 'p50 (ms)', 'p95 (ms)', 'max (ms)']
+
+# HUD of the rolling timings kept by instrumentation, slowest p95 first
+# subscribed like a page so it refreshes with the frames, but only rebuilds the table every refresh_interval seconds
+class TimingPage(DataPageInterface):
+    def __init__(self, data_source: DataViewPublisher, visible: bool = False, refresh_interval: float = default_refresh_interval):
+        super().__init__()
+        self.data_source = data_source
+        self.data_source.subscribe(self)
+        self.visible = visible
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0.0
+        self.setup()
+
+    def setup(self):
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        controls.setAlignment(Qt.AlignmentFlag.AlignLeft)
+
+        self.enabled_checkbox = QCheckBox('Record timings')
+        self.enabled_checkbox.setChecked(instrumentation.enabled)
+        self.enabled_checkbox.toggled.connect(instrumentation.set_enabled)
+        reset_button = QPushButton('Reset')
+        reset_button.clicked.connect(self.reset)
+        export_button = QPushButton('Export trace')
+        export_button.clicked.connect(self.exportTrace)
+        for widget in [self.enabled_checkbox, reset_button, export_button]:
+            controls.addWidget(widget)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(timing_columns))
+        self.table.setHorizontalHeaderLabels(timing_columns)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+
+        layout.addLayout(controls)
+        layout.addWidget(self.table)
+
+    def updateData(self, data):
+        self.updateBatch([data])
+
+    def updateBatch(self, samples):
+        now = time.perf_counter()
+        if self.visible and now - self.last_refresh >= self.refresh_interval:
+            self.last_refresh = now
+            self.refresh()
+
+    def refresh(self):
+        rows = instrumentation.summary()
+        self.table.setRowCount(len(rows))
+        self.table.setVerticalHeaderLabels([row[0] for row in rows])
+        for i, (_, calls, p50, p95, maximum) in enumerate(rows):
+            for column, text in enumerate([str(calls), f'{p50:.3f}', f'{p95:.3f}', f'{maximum:.3f}']):
+                self.table.setItem(i, column, QTableWidgetItem(text))
+
+    def reset(self):
+        instrumentation.reset()
+        self.refresh()
+
+    def exportTrace(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Export trace', 'trace.json', 'Chrome trace (*.json)')
+        if path:
+            instrumentation.export_trace(path)